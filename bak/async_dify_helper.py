@@ -0,0 +1,351 @@
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, AsyncIterator, Iterable, Optional, Tuple, Union
+
+import aiohttp
+
+from dify_helper import WORKFLOW_URL, WorkflowRunError, client_registry
+from instrumentation import Instrumentation, NOOP_TRACE
+from result_cache import WorkflowResultCache
+from sse_parser import aiter_sse_events, failure_of, run_failure, text_of
+
+
+@dataclass
+class WorkflowRunResult:
+    """
+    单次工作流调用的结果（用于并发批量调用时逐个汇报）
+    """
+    record: Dict[str, Any]
+    output: Union[Dict, str]
+    error: Optional[Exception]
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class AsyncDifyHelper:
+    def __init__(self, workflow_api_url: str = WORKFLOW_URL, workflow_api_key: str = None, max_retries=5, base_delay=10, max_delay=600, timeout=900, pool_maxsize=20, instrumentation: Optional[Instrumentation] = None):
+        """
+        Initialize the asyncio counterpart of DifyHelper with the same retry parameters.
+
+        Args:
+            workflow_api_url: The URL for the workflow API (default: Dify ALB URL)
+            workflow_api_key: The API key for authentication
+            max_retries: Maximum number of retry attempts (default: 5)
+            base_delay: Initial delay in seconds (default: 10)
+            max_delay: Maximum delay in seconds (default: 600)
+            timeout: Request timeout in seconds (default: 900 = 15 minutes)
+            pool_maxsize: Maximum number of pooled connections (default: 20)
+            instrumentation: Optional metrics collector (TTFB, stream duration, retries, backoff)
+        """
+        self.workflow_api_url = workflow_api_url
+        self.workflow_api_key = workflow_api_key
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.instrumentation = instrumentation
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 会话需在事件循环内创建，因此延迟到第一次调用时
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def _client_timeout(self) -> aiohttp.ClientTimeout:
+        # 与requests的timeout一致：限制建立连接和两次读取之间的间隔，而不是整个流的总时长
+        return aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+
+    def _trace(self, response_mode: str):
+        if self.instrumentation is None:
+            return NOOP_TRACE
+        return self.instrumentation.start_call(response_mode)
+
+    async def _sleep_before_retry(self, exponent: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** exponent))
+        jitter = random.uniform(0, 0.1 * delay)
+        sleep_time = delay + jitter
+
+        print(f"等待 {sleep_time:.2f} 秒后重试...")
+        await asyncio.sleep(sleep_time)
+        return sleep_time
+
+    async def invoke_workflow(self, record: Dict[str, Any], response_mode: str = "streaming") -> Union[Dict, str]:
+        """
+        Invoke the workflow with retry mechanism and exponential backoff.
+
+        Args:
+            record: The input data for the workflow
+            response_mode: The response mode, either "streaming" or "blocking" (default: "streaming")
+
+        Returns:
+            The workflow output or an empty result if all retries fail
+        """
+        result, _ = await self.invoke_workflow_result(record, response_mode=response_mode)
+        return result
+
+    async def invoke_workflow_result(self, record: Dict[str, Any], response_mode: str = "streaming") -> Tuple[Union[Dict, str], Optional[Exception]]:
+        """
+        Same as invoke_workflow, but also returns the last error so callers can
+        tell a failed run apart from an empty result.
+
+        Args:
+            record: The input data for the workflow
+            response_mode: The response mode, either "streaming" or "blocking" (default: "streaming")
+
+        Returns:
+            (output, None) on success, or (fallback output, last error) if all retries fail
+        """
+        headers = {
+            "Authorization": f"Bearer {self.workflow_api_key}",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+            "User-Agent": "genai-insight/1.0"
+        }
+        payload = {
+            "inputs": record,
+            "response_mode": response_mode,
+            "user": "genai-insight"
+        }
+        timeout = self._client_timeout()
+        session = self._get_session()
+
+        retry_count = 0
+        last_error = None
+        trace = self._trace(response_mode)
+
+        while retry_count <= self.max_retries:
+            try:
+                print(f"尝试调用工作流 (第 {retry_count + 1} 次)...")
+                trace.attempt()
+
+                async with session.post(self.workflow_api_url, headers=headers, data=json.dumps(payload), timeout=timeout) as response:
+                    response.raise_for_status()
+
+                    if response_mode == "blocking":
+                        body = await response.read()
+                        trace.chunk(len(body))
+                        result = json.loads(body)
+                        failure = run_failure(result["data"])
+                        if failure is not None:
+                            raise WorkflowRunError(failure)
+                        print("工作流调用成功 (blocking模式)")
+                        trace.finish()
+                        return result["data"].get("outputs", {}), None
+
+                    text_chunks = []
+                    async for event in aiter_sse_events(trace.awrap(response.content.iter_any())):
+                        text = text_of(event)
+                        if text is not None:
+                            trace.text()
+                            text_chunks.append(text)
+                            continue
+                        failure = failure_of(event)
+                        if failure is not None:
+                            raise WorkflowRunError(failure)
+
+                    result = "".join(text_chunks)
+                    print(f"工作流调用成功 (streaming模式)，返回文本长度: {len(result)}")
+                    trace.finish()
+                    return result, None
+
+            except WorkflowRunError as e:
+                # 工作流本身运行失败，重新运行同样的输入需要再次消耗LLM调用，交由上层决定
+                last_error = e
+                retry_count += 1
+                trace.failure(e)
+                print(f"工作流运行失败 (不重试): {e}")
+                break
+
+            except asyncio.TimeoutError as e:
+                last_error = e
+                retry_count += 1
+                trace.failure(e)
+                print(f"请求超时 (第 {retry_count} 次尝试): {e}")
+
+                if retry_count > self.max_retries:
+                    break
+
+                # 对于超时错误，使用更长的等待时间
+                trace.backoff(await self._sleep_before_retry(retry_count))
+
+            except aiohttp.ClientResponseError as e:
+                last_error = e
+                retry_count += 1
+                trace.failure(e)
+
+                if e.status == 504:
+                    print(f"Gateway Timeout (504) 错误 (第 {retry_count} 次尝试): {e}")
+
+                    if retry_count > self.max_retries:
+                        break
+
+                    trace.backoff(await self._sleep_before_retry(retry_count))
+                else:
+                    # 其他HTTP错误不重试
+                    print(f"HTTP错误 (不重试): {e}")
+                    break
+
+            except (aiohttp.ClientError, json.JSONDecodeError, KeyError) as e:
+                last_error = e
+                retry_count += 1
+                trace.failure(e)
+                print(f"请求异常 (第 {retry_count} 次尝试): {e}")
+
+                if retry_count > self.max_retries:
+                    break
+
+                trace.backoff(await self._sleep_before_retry(retry_count - 1))
+
+        trace.finish(last_error)
+        print(f"所有 {self.max_retries} 次重试都失败了。最后的错误: {last_error}")
+        return ("" if response_mode == 'streaming' else {}), last_error
+
+    async def stream_workflow(self, record: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Invoke the workflow in streaming mode and yield events as they arrive.
+
+        Same contract as DifyHelper.stream_workflow: failures are retried only
+        while nothing has been yielded yet, later errors are raised, and a run
+        that Dify reports as failed raises WorkflowRunError.
+
+        Args:
+            record: The input data for the workflow
+
+        Yields:
+            SSE events, e.g. {"event": "text_chunk", "data": {"text": ...}}
+        """
+        headers = {
+            "Authorization": f"Bearer {self.workflow_api_key}",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+            "User-Agent": "genai-insight/1.0"
+        }
+        payload = {
+            "inputs": record,
+            "response_mode": "streaming",
+            "user": "genai-insight"
+        }
+        timeout = self._client_timeout()
+        session = self._get_session()
+
+        retry_count = 0
+        last_error = None
+        trace = self._trace("streaming")
+
+        while retry_count <= self.max_retries:
+            yielded = False
+            try:
+                print(f"尝试调用工作流 (第 {retry_count + 1} 次)...")
+                trace.attempt()
+                async with session.post(self.workflow_api_url, headers=headers, data=json.dumps(payload), timeout=timeout) as response:
+                    response.raise_for_status()
+                    async for event in aiter_sse_events(trace.awrap(response.content.iter_any())):
+                        if text_of(event) is not None:
+                            trace.text()
+                        else:
+                            failure = failure_of(event)
+                            if failure is not None:
+                                raise WorkflowRunError(failure)
+                        yielded = True
+                        yield event
+                trace.finish()
+                return
+            except WorkflowRunError as e:
+                trace.failure(e)
+                trace.finish(e)
+                raise
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                trace.failure(e)
+                if yielded:
+                    trace.finish(e)
+                    raise
+                last_error = e
+                retry_count += 1
+                exponent = self._retry_exponent(e, retry_count)
+                if exponent is None:
+                    print(f"HTTP错误 (不重试): {e}")
+                    break
+                print(f"请求异常 (第 {retry_count} 次尝试): {e}")
+                if retry_count > self.max_retries:
+                    break
+
+                trace.backoff(await self._sleep_before_retry(exponent))
+
+        trace.finish(last_error)
+        print(f"所有 {self.max_retries} 次重试都失败了。最后的错误: {last_error}")
+        raise last_error
+
+    @staticmethod
+    def _retry_exponent(error: Exception, retry_count: int) -> Optional[int]:
+        """
+        Backoff exponent for an error under the invoke_workflow retry rules,
+        or None if the error must not be retried.
+        """
+        if isinstance(error, asyncio.TimeoutError):
+            return retry_count
+        if isinstance(error, aiohttp.ClientResponseError):
+            return retry_count if error.status == 504 else None
+        return retry_count - 1
+
+    async def close(self):
+        """
+        关闭会话连接
+        """
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+async def invoke_workflows(records: Iterable[Dict[str, Any]], workflow_api_key: str, concurrency: int = 4, response_mode: str = "streaming", workflow_api_url: str = WORKFLOW_URL, instrumentation: Optional[Instrumentation] = None, cache: Optional[WorkflowResultCache] = None, workflow: Optional[str] = None, **helper_kwargs) -> AsyncIterator[WorkflowRunResult]:
+    """
+    并发调用同一个工作流，最多同时运行 concurrency 个请求，按完成顺序逐个返回结果
+
+    调用经由 client_registry，与正在进行的相同调用合并；提供 cache 时结果由注册表写入缓存，
+    并与其他进程（例如每日采集）中的相同调用去重。
+
+    Args:
+        records: 每次调用的工作流输入
+        workflow_api_key: 工作流API密钥
+        concurrency: 最大并发数 (default: 4)
+        response_mode: "streaming" 或 "blocking" (default: "streaming")
+        workflow_api_url: 工作流API地址
+        instrumentation: 指标采集（可选）
+        cache: 结果缓存（可选）
+        workflow: 工作流名称（缓存中的键），提供 cache 时必填
+        helper_kwargs: 透传给AsyncDifyHelper的重试参数 (max_retries, base_delay, max_delay, timeout)
+
+    Yields:
+        WorkflowRunResult，顺序为完成顺序
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with AsyncDifyHelper(workflow_api_url=workflow_api_url, workflow_api_key=workflow_api_key, pool_maxsize=max(concurrency, 1), instrumentation=instrumentation, **helper_kwargs) as helper:
+        async def run_one(record: Dict[str, Any]) -> WorkflowRunResult:
+            async with semaphore:
+                started = time.monotonic()
+                output, error = await client_registry.ainvoke_result(helper, record, response_mode=response_mode, cache=cache, workflow=workflow)
+                return WorkflowRunResult(record=record, output=output, error=error, elapsed=time.monotonic() - started)
+
+        tasks = [asyncio.ensure_future(run_one(record)) for record in records]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+            # 等待被取消的任务结束，避免在关闭会话后仍有请求运行（以及"Task was destroyed"警告）
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,380 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from async_dify_helper import AsyncDifyHelper, invoke_workflows
+from dify_helper import DifyHelper
+from fake_dify_server import FakeDifyConfig, FakeDifyServer, add_config_arguments, config_from_args
+from instrumentation import Instrumentation, MetricsRegistry
+from job_scheduler import AdaptiveRateLimiter, JobScheduler
+
+BENCHMARK_OUTPUT_DIR = 'benchmark_results'
+
+# 与基线比较时，这些指标变差超过容差即视为回归: 指标 -> 越大越好?
+REGRESSION_METRICS = {
+    'throughput': True,
+    'latency.p50': False,
+    'latency.p90': False,
+    'peak_memory_bytes': False,
+}
+
+CLIENTS = ('sync', 'async', 'scheduler', 'fanout')
+
+
+class _RecordCollector:
+    """
+    收集Instrumentation输出的每次调用摘要
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+
+    def emit(self, record: Dict[str, Any], registry: MetricsRegistry):
+        with self._lock:
+            self.records.append(record)
+
+
+def _serve(config: FakeDifyConfig, port_queue: multiprocessing.Queue):
+    server = FakeDifyServer(config)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server_process(config: FakeDifyConfig) -> Tuple[multiprocessing.Process, str]:
+    """
+    在独立进程中运行假Dify服务，避免服务端的内存和GIL影响客户端的测量
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(config, port_queue), daemon=True)
+    process.start()
+    port = port_queue.get(timeout=10)
+    return process, f"http://127.0.0.1:{port}/v1/workflows/run"
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def _run_sync(url: str, records: List[Dict[str, Any]], response_mode: str, concurrency: int, instrumentation: Instrumentation, helper_kwargs: Dict[str, Any]) -> List[Optional[Exception]]:
+    # 与JobScheduler一样，每个工作线程使用自己的DifyHelper
+    local = threading.local()
+    helpers = []
+
+    def run_one(record: Dict[str, Any]) -> Optional[Exception]:
+        helper = getattr(local, 'helper', None)
+        if helper is None:
+            helper = local.helper = DifyHelper(workflow_api_url=url, workflow_api_key='benchmark', instrumentation=instrumentation, **helper_kwargs)
+            helpers.append(helper)
+        _, error = helper.invoke_workflow_result(record, response_mode=response_mode)
+        return error
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(run_one, records))
+    finally:
+        for helper in helpers:
+            helper.close()
+
+
+async def _run_async(url: str, records: List[Dict[str, Any]], response_mode: str, concurrency: int, instrumentation: Instrumentation, helper_kwargs: Dict[str, Any]) -> List[Optional[Exception]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    async with AsyncDifyHelper(workflow_api_url=url, workflow_api_key='benchmark', pool_maxsize=concurrency, instrumentation=instrumentation, **helper_kwargs) as helper:
+        async def run_one(record: Dict[str, Any]) -> Optional[Exception]:
+            async with semaphore:
+                _, error = await helper.invoke_workflow_result(record, response_mode=response_mode)
+                return error
+
+        return await asyncio.gather(*(run_one(record) for record in records))
+
+
+def _run_scheduler(url: str, records: List[Dict[str, Any]], concurrency: int, instrumentation: Instrumentation, helper_kwargs: Dict[str, Any]) -> Tuple[List[Optional[Exception]], Dict[str, Any]]:
+    # 重试参数换算为调度器的等价设置：每次调用只尝试一次，重试和退避由调度器和限流器安排
+    rate_limiter = AdaptiveRateLimiter(max_limit=concurrency, base_cooldown=helper_kwargs['base_delay'], max_cooldown=helper_kwargs['max_delay'])
+    scheduler = JobScheduler(
+        'benchmark', workflow_api_url=url, max_workers=concurrency, max_attempts=helper_kwargs['max_retries'] + 1,
+        timeout=helper_kwargs['timeout'], retry_delay=helper_kwargs['base_delay'], max_retry_delay=helper_kwargs['max_delay'],
+        rate_limiter=rate_limiter, instrumentation=instrumentation
+    )
+    for record in records:
+        scheduler.submit(record['repo'], record['start_date'])
+    results = scheduler.run()
+    return [result.error for result in results], {"final_limit": rate_limiter.current_limit}
+
+
+async def _run_fanout(url: str, records: List[Dict[str, Any]], response_mode: str, concurrency: int, instrumentation: Instrumentation, helper_kwargs: Dict[str, Any]) -> List[Optional[Exception]]:
+    return [result.error async for result in invoke_workflows(records, 'benchmark', concurrency, response_mode, url, instrumentation, **helper_kwargs)]
+
+
+def _run_client(url: str, client: str, records: List[Dict[str, Any]], response_mode: str, concurrency: int, instrumentation: Instrumentation, helper_kwargs: Dict[str, Any]) -> Tuple[List[Optional[Exception]], Dict[str, Any]]:
+    """
+    Returns:
+        (每个输入的错误, 客户端特有的附加指标)
+    """
+    if client == 'scheduler':
+        return _run_scheduler(url, records, concurrency, instrumentation, helper_kwargs)
+    if client == 'fanout':
+        return asyncio.run(_run_fanout(url, records, response_mode, concurrency, instrumentation, helper_kwargs)), {}
+    if client == 'async':
+        return asyncio.run(_run_async(url, records, response_mode, concurrency, instrumentation, helper_kwargs)), {}
+    return _run_sync(url, records, response_mode, concurrency, instrumentation, helper_kwargs), {}
+
+
+def _scheduler_metrics(registry: MetricsRegistry, workflow: str) -> Dict[str, Any]:
+    slot_wait = registry.histogram('dify_scheduler_slot_wait_seconds', workflow=workflow)
+    return {
+        "requeues": {
+            reason: int(registry.counter('dify_scheduler_requeues_total', workflow=workflow, reason=reason))
+            for reason in ("overload", "retryable")
+        },
+        "requeue_delay_seconds": round(sum(
+            registry.counter('dify_scheduler_requeue_delay_seconds_total', workflow=workflow, reason=reason)
+            for reason in ("overload", "retryable")
+        ), 4),
+        "cooldowns": int(registry.counter('dify_scheduler_cooldowns_total', workflow=workflow)),
+        "cooldown_seconds": round(registry.counter('dify_scheduler_cooldown_seconds_total', workflow=workflow), 4),
+        # LATENCY_BUCKETS 最小的桶为0.1秒，分位数估计不出槽位等待的变化，这里用平均值
+        "slot_wait_mean": round(slot_wait.sum / slot_wait.count, 4) if slot_wait and slot_wait.count else None,
+    }
+
+
+def run_scenario(url: str, client: str, response_mode: str, concurrency: int, requests_count: int, helper_kwargs: Dict[str, Any], trace_memory: bool = True, quiet: bool = True) -> Dict[str, Any]:
+    """
+    运行一个场景并汇总指标
+
+    Args:
+        url: 工作流API地址（假Dify服务）
+        client: "sync" (DifyHelper + 线程池)、"async" (AsyncDifyHelper)、
+            "scheduler" (JobScheduler + AdaptiveRateLimiter，只支持streaming) 或
+            "fanout" (invoke_workflows，经由 client_registry)
+        response_mode: "streaming" 或 "blocking"
+        concurrency: 并发数
+        requests_count: 调用次数
+        helper_kwargs: 透传给DifyHelper/AsyncDifyHelper的重试参数
+        trace_memory: 是否用tracemalloc统计客户端内存峰值（会降低吞吐，但各版本间可比）
+        quiet: 屏蔽DifyHelper每次尝试的print输出
+    """
+    collector = _RecordCollector()
+    registry = MetricsRegistry()
+    instrumentation = Instrumentation('benchmark', sinks=[collector], registry=registry)
+    records = [{"repo": f"https://github.com/benchmark/repo-{i}", "start_date": "2025-01-01"} for i in range(requests_count)]
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+            if quiet:
+                # JobScheduler和限流器通过logging输出每个任务的进度
+                logging.disable(logging.ERROR)
+            errors, extra = _run_client(url, client, records, response_mode, concurrency, instrumentation, helper_kwargs)
+        wall = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if quiet:
+            logging.disable(logging.NOTSET)
+        if trace_memory:
+            tracemalloc.stop()
+
+    calls = collector.records
+    errors_by_class: Dict[str, int] = {}
+    for call in calls:
+        for name, count in call["errors"].items():
+            errors_by_class[name] = errors_by_class.get(name, 0) + count
+    attempts = sum(call["attempts"] for call in calls)
+    backoff = sum(call["backoff_seconds"] for call in calls)
+    busy = sum(call["duration"] for call in calls)
+    ok = sum(1 for error in errors if error is None)
+
+    result = {
+        "client": client,
+        "response_mode": response_mode,
+        "concurrency": concurrency,
+        "requests": requests_count,
+        "ok": ok,
+        "failed": requests_count - ok,
+        "wall_seconds": round(wall, 4),
+        "throughput": round(ok / wall, 4) if wall > 0 else None,
+        "latency": _percentiles([call["duration"] for call in calls if call["status"] == "success"]),
+        "ttfb": _percentiles([call["ttfb"] for call in calls if call["status"] == "success" and call["ttfb"] is not None]),
+        "first_text": _percentiles([call["first_text"] for call in calls if call["status"] == "success" and call["first_text"] is not None]),
+        "retry_overhead": {
+            "attempts": attempts,
+            # JobScheduler的每次尝试各记为一次调用，因此按输入数计算
+            "extra_attempts": attempts - requests_count,
+            "errors": errors_by_class,
+            "backoff_seconds": round(backoff, 4),
+            # 调用总耗时中花在退避等待上的比例
+            "backoff_share": round(backoff / busy, 4) if busy > 0 else 0.0,
+        },
+        "bytes": sum(call["bytes"] for call in calls),
+        "peak_memory_bytes": peak_memory,
+    }
+    if client == 'scheduler':
+        result["scheduler"] = {**_scheduler_metrics(registry, instrumentation.workflow), **extra}
+    return result
+
+
+def _scenario_key(result: Dict[str, Any]) -> str:
+    return f"{result['client']}/{result['response_mode']}/c{result['concurrency']}"
+
+
+def _metric(result: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = result
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.1) -> List[str]:
+    """
+    与基线结果比较，返回超过容差的回归描述（同名场景才比较）
+    """
+    baseline_by_key = {_scenario_key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in current.get("results", []):
+        key = _scenario_key(result)
+        previous = baseline_by_key.get(key)
+        if previous is None:
+            continue
+        for path, higher_is_better in REGRESSION_METRICS.items():
+            new, old = _metric(result, path), _metric(previous, path)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{key} {path}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_summary(results: List[Dict[str, Any]]):
+    print(f"{'场景':<26}{'成功/总数':>10}{'吞吐(次/秒)':>14}{'p50(s)':>10}{'p90(s)':>10}{'p99(s)':>10}{'重试':>6}{'退避占比':>10}{'内存峰值(KB)':>14}")
+    for result in results:
+        latency = result["latency"]
+        memory = result["peak_memory_bytes"]
+        print(
+            f"{_scenario_key(result):<26}"
+            f"{result['ok']:>5}/{result['requests']:<4}"
+            f"{result['throughput'] or 0:>14.2f}"
+            f"{latency['p50'] or 0:>10.3f}{latency['p90'] or 0:>10.3f}{latency['p99'] or 0:>10.3f}"
+            f"{result['retry_overhead']['extra_attempts']:>6}"
+            f"{result['retry_overhead']['backoff_share']:>10.1%}"
+            f"{(memory or 0) / 1024:>14.0f}"
+        )
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def _str_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DifyHelper / AsyncDifyHelper 离线基准测试（使用本地假Dify服务）')
+    parser.add_argument('--clients', type=_str_list, default=list(CLIENTS), help=f'客户端，逗号分隔: {",".join(CLIENTS)}')
+    parser.add_argument('--modes', type=_str_list, default=['streaming', 'blocking'], help='响应模式，逗号分隔: streaming,blocking')
+    parser.add_argument('--concurrency', '-c', type=_int_list, default=[1, 4, 16], help='并发数，逗号分隔 (默认: 1,4,16)')
+    parser.add_argument('--requests', '-n', type=int, default=64, help='每个场景的调用次数 (默认: 64)')
+    parser.add_argument('--timeout', type=float, default=2.0, help='客户端请求超时(秒)，应小于 --hang-seconds')
+    parser.add_argument('--max-retries', type=int, default=3, help='客户端最大重试次数')
+    parser.add_argument('--base-delay', type=float, default=0.05, help='客户端初始退避时间(秒)')
+    parser.add_argument('--max-delay', type=float, default=1.0, help='客户端最大退避时间(秒)')
+    parser.add_argument('--no-tracemalloc', action='store_true', help='不统计内存峰值（吞吐更接近真实情况）')
+    parser.add_argument('--verbose', action='store_true', help='显示DifyHelper每次尝试的输出')
+    parser.add_argument('--output', '-o', type=str, default=None, help=f'结果JSON路径 (默认: {BENCHMARK_OUTPUT_DIR}/benchmark_<时间>.json)')
+    parser.add_argument('--baseline', type=str, default=None, help='基线结果JSON，有回归时以非0状态退出')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='回归判定容差 (默认: 0.1 = 10%%)')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    unknown = [client for client in args.clients if client not in CLIENTS]
+    if unknown:
+        parser.error(f"未知的客户端: {','.join(unknown)}")
+    if config.timeout_rate > 0 and config.hang_seconds <= args.timeout:
+        parser.error("--hang-seconds 必须大于 --timeout，否则注入的超时不会触发")
+    helper_kwargs = {"max_retries": args.max_retries, "base_delay": args.base_delay, "max_delay": args.max_delay, "timeout": args.timeout}
+
+    process, url = start_server_process(config)
+    results = []
+    try:
+        for client in args.clients:
+            for response_mode in args.modes:
+                if client == 'scheduler' and response_mode != 'streaming':
+                    continue
+                for concurrency in args.concurrency:
+                    print(f"运行场景: {client}/{response_mode}/c{concurrency} ...")
+                    results.append(run_scenario(url, client, response_mode, concurrency, args.requests, helper_kwargs, trace_memory=not args.no_tracemalloc, quiet=not args.verbose))
+    finally:
+        process.terminate()
+        process.join()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": asdict(config),
+        "client": {**helper_kwargs, "requests": args.requests, "tracemalloc": not args.no_tracemalloc},
+        "results": results,
+    }
+
+    output = args.output or os.path.join(BENCHMARK_OUTPUT_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    _print_summary(results)
+    print(f"结果已保存: {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_results(report, json.load(f), args.tolerance)
+        if regressions:
+            print("与基线相比出现回归:")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print("与基线相比没有回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from trend_metrics import METRICS, METRIC_LABELS, TrendMetrics
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_CHART_NAME = 'activity_trends.png'
+
+# 学术论文风格的配色（色盲友好）
+PALETTE = ['#0072B2', '#D55E00', '#009E73', '#CC79A7', '#E69F00', '#56B4E9', '#F0E442', '#000000']
+LINE_STYLES = ['-', '--', '-.', ':']
+CJK_FONTS = ['Noto Sans CJK SC', 'Source Han Sans SC', 'WenQuanYi Micro Hei', 'PingFang SC', 'Microsoft YaHei', 'SimHei']
+
+
+def _series(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def _repo_label(repo: str) -> str:
+    # https://github.com/owner/repo -> repo
+    return repo.rstrip('/').rsplit('/', 1)[-1]
+
+
+def activity_chart_spec(metrics: TrendMetrics, path: str, repos: Optional[List[str]] = None, title: Optional[str] = None) -> Dict[str, Any]:
+    """
+    生成 README §3 要求的4子图趋势图描述：新增PR / 新增Merged PR / 新增Issue / 新增Star，
+    每个子图包含所有repo
+
+    返回的是只包含基本类型的dict，可以跨进程传递，也用于计算内容哈希。
+    """
+    rows = [metrics.repos.index(repo) for repo in (repos or metrics.repos)]
+    return {
+        "path": path,
+        "title": title,
+        "dates": [date[5:] for date in metrics.dates],
+        "panels": [
+            {
+                "title": METRIC_LABELS[name],
+                "lines": [{"label": _repo_label(metrics.repos[i]), "values": _series(metrics.daily[name][i])} for i in rows],
+            }
+            for name in METRICS
+        ],
+    }
+
+
+def activity_chart_specs(metrics: TrendMetrics, images_dir: str, domains: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """
+    总体趋势图，以及（提供 domains 时）每个领域一张趋势图
+    """
+    specs = [activity_chart_spec(metrics, os.path.join(images_dir, ACTIVITY_CHART_NAME))]
+    for domain in sorted(set((domains or {}).values())):
+        repos = [repo for repo in metrics.repos if domains.get(repo) == domain]
+        if not repos:
+            continue
+        slug = re.sub(r'[^\w]+', '_', domain).strip('_').lower() or 'domain'
+        specs.append(activity_chart_spec(metrics, os.path.join(images_dir, f"activity_trends_{slug}.png"), repos, title=domain))
+    return specs
+
+
+def spec_hash(spec: Dict[str, Any]) -> str:
+    payload = json.dumps(spec, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _hash_path(path: str) -> str:
+    return f"{path}.sha256"
+
+
+def _is_fresh(spec: Dict[str, Any], digest: str) -> bool:
+    path = spec["path"]
+    if not os.path.exists(path) or not os.path.exists(_hash_path(path)):
+        return False
+    with open(_hash_path(path), encoding='utf-8') as f:
+        return f.read().strip() == digest
+
+
+def _render(spec: Dict[str, Any]) -> str:
+    # matplotlib导入较慢，只在真正需要绘图时（且在工作进程中）导入
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    # 中文标题需要CJK字体，按顺序使用系统中第一个可用的
+    plt.rcParams['font.sans-serif'] = CJK_FONTS + plt.rcParams['font.sans-serif']
+    plt.rcParams['axes.unicode_minus'] = False
+
+    dates = spec["dates"]
+    x = np.arange(len(dates))
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8), sharex=True)
+    for ax, panel in zip(axes.flat, spec["panels"]):
+        for i, line in enumerate(panel["lines"]):
+            values = np.array([np.nan if v is None else v for v in line["values"]], dtype=float)
+            ax.plot(x, values, marker='o', markersize=3, linewidth=1.2,
+                    color=PALETTE[i % len(PALETTE)], linestyle=LINE_STYLES[(i // len(PALETTE)) % len(LINE_STYLES)],
+                    label=line["label"])
+        ax.set_title(panel["title"], fontsize=11)
+        ax.grid(True, linestyle=':', linewidth=0.5, alpha=0.7)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+
+    step = max(1, len(dates) // 8)
+    for ax in axes[1]:
+        ax.set_xticks(x[::step])
+        ax.set_xticklabels(dates[::step], rotation=45, ha='right', fontsize=8)
+
+    handles, labels = axes.flat[0].get_legend_handles_labels()
+    if handles:
+        fig.legend(handles, labels, loc='lower center', ncol=min(len(labels), 6), fontsize=8, frameon=False)
+    if spec.get("title"):
+        fig.suptitle(spec["title"], fontsize=12)
+    fig.tight_layout(rect=(0, 0.06, 1, 0.97))
+
+    os.makedirs(os.path.dirname(spec["path"]) or '.', exist_ok=True)
+    fig.savefig(spec["path"], dpi=150)
+    plt.close(fig)
+    return spec["path"]
+
+
+def render_charts(specs: List[Dict[str, Any]], max_workers: Optional[int] = None, force: bool = False) -> List[str]:
+    """
+    渲染图表；输入数据未变化（内容哈希相同且图片存在）的图表会被跳过
+
+    Args:
+        specs: activity_chart_spec 等生成的图表描述
+        max_workers: 并行渲染的进程数，默认为CPU数
+        force: 忽略哈希，全部重新渲染
+
+    Returns:
+        所有图表的路径（包括被跳过的）
+    """
+    digests = [spec_hash(spec) for spec in specs]
+    stale = [(spec, digest) for spec, digest in zip(specs, digests) if force or not _is_fresh(spec, digest)]
+    if len(stale) < len(specs):
+        logger.info(f"{len(specs) - len(stale)} 张图表数据未变化，跳过渲染")
+
+    if len(stale) == 1 or max_workers == 1:
+        for spec, _ in stale:
+            _render(spec)
+    elif stale:
+        with ProcessPoolExecutor(max_workers=min(len(stale), max_workers or os.cpu_count() or 1)) as executor:
+            list(executor.map(_render, [spec for spec, _ in stale]))
+
+    for spec, digest in stale:
+        with open(_hash_path(spec["path"]), 'w', encoding='utf-8') as f:
+            f.write(digest)
+    return [spec["path"] for spec in specs]
@@ -1,34 +1,41 @@
+import asyncio
+import atexit
 import json
 import requests
+import threading
 import time
 import random
-from typing import Dict, Any, List, Optional, Tuple, Union
-from json_repair import repair_json
+from concurrent.futures import Future
+from typing import Dict, Any, Awaitable, Iterator, List, Optional, Tuple, Union
+from sse_parser import iter_sse_events, failure_of, run_failure, text_of
+from instrumentation import Instrumentation, NOOP_TRACE
+from result_cache import WorkflowResultCache, cache_key
 
 WORKFLOW_URL = 'http://dify-alb-1-281306538.us-west-2.elb.amazonaws.com/v1/workflows/run'
 
-def invoke_slow_workflow(record: Dict[str, Any], workflow_api_key:str) -> str:
+class WorkflowRunError(Exception):
+    """
+    请求成功 (HTTP 200)，但Dify报告工作流运行失败（error事件或status为failed/stopped）
+    """
+
+def invoke_slow_workflow(record: Dict[str, Any], workflow_api_key:str, instrumentation: Optional[Instrumentation] = None) -> str:
     """
     使用DifyHelper调用Dify API（流式模式）
     
+    同一线程内同一个工作流的调用复用连接池；相同输入的并发调用只会触发一次上游运行。
+    
     Args:
         record: 工作流的输入数据
         workflow_api_key: 工作流API密钥
+        instrumentation: 指标采集（可选）
         
     Returns:
         工作流响应文本
     """
-    # 创建DifyHelper实例
-    dify_helper = DifyHelper(
-        workflow_api_url=WORKFLOW_URL,
-        workflow_api_key=workflow_api_key
-    )
-    
-    # 调用工作流API
-    return dify_helper.invoke_workflow(record, response_mode="streaming")
+    return client_registry.invoke(record, workflow_api_key, response_mode="streaming", instrumentation=instrumentation)
 
 class DifyHelper:
-    def __init__(self, workflow_api_url: str = "http://dify-alb-1-281306538.us-west-2.elb.amazonaws.com/v1/workflows/run", workflow_api_key: str = None, max_retries=5, base_delay=10, max_delay=600, timeout=900):
+    def __init__(self, workflow_api_url: str = "http://dify-alb-1-281306538.us-west-2.elb.amazonaws.com/v1/workflows/run", workflow_api_key: str = None, max_retries=5, base_delay=10, max_delay=600, timeout=900, instrumentation: Optional[Instrumentation] = None):
         """
         Initialize the DifyHelper with retry parameters.
         
@@ -39,6 +46,7 @@ class DifyHelper:
             base_delay: Initial delay in seconds (default: 10)
             max_delay: Maximum delay in seconds (default: 600)
             timeout: Request timeout in seconds (default: 900 = 15 minutes)
+            instrumentation: Optional metrics collector (TTFB, stream duration, retries, backoff)
         """
         self.workflow_api_url = workflow_api_url
         self.workflow_api_key = workflow_api_key
@@ -46,6 +54,7 @@ class DifyHelper:
         self.base_delay = base_delay
         self.max_delay = max_delay
         self.timeout = timeout
+        self.instrumentation = instrumentation
         
         # 创建一个会话对象以复用连接
         self.session = requests.Session()
@@ -69,6 +78,21 @@ class DifyHelper:
         Returns:
             The workflow output or an error dict if all retries fail
         """
+        result, _ = self.invoke_workflow_result(record, response_mode=response_mode)
+        return result
+    
+    def invoke_workflow_result(self, record: Dict[str, Any], response_mode: str = "streaming") -> Tuple[Union[Dict, str], Optional[Exception]]:
+        """
+        Same as invoke_workflow, but also returns the last error so callers can
+        tell a failed run apart from an empty result.
+        
+        Args:
+            record: The input data for the workflow
+            response_mode: The response mode, either "streaming" or "blocking" (default: "streaming")
+            
+        Returns:
+            (output, None) on success, or (fallback output, last error) if all retries fail
+        """
         headers = {
             "Authorization": f"Bearer {self.workflow_api_key}", 
             "Content-Type": "application/json",
@@ -83,10 +107,12 @@ class DifyHelper:
         
         retry_count = 0
         last_error = None
+        trace = self._trace(response_mode)
         
         while retry_count <= self.max_retries:
             try:
                 print(f"尝试调用工作流 (第 {retry_count + 1} 次)...")
+                trace.attempt()
                 
                 if response_mode == "blocking":
                     # For blocking mode, we don't need streaming
@@ -97,11 +123,16 @@ class DifyHelper:
                         timeout=self.timeout
                     )
                     response.raise_for_status()  # Raise an exception for 4XX/5XX responses
+                    trace.chunk(len(response.content))
                     
                     # Process blocking response
                     result = response.json()
+                    failure = run_failure(result["data"])
+                    if failure is not None:
+                        raise WorkflowRunError(failure)
                     print("工作流调用成功 (blocking模式)")
-                    return result["data"].get("outputs", {})
+                    trace.finish()
+                    return result["data"].get("outputs", {}), None
                 else:
                     # For streaming mode
                     response = self.session.post(
@@ -113,56 +144,48 @@ class DifyHelper:
                     )
                     response.raise_for_status()  # Raise an exception for 4XX/5XX responses
                     
-                    # Process streaming response
+                    # Process streaming response incrementally
                     text_chunks = []
-                    
-                    for line in response.iter_lines(decode_unicode=True):
-                        if not line:
-                            continue
-
-                        # Remove the "data: " prefix if present
-                        if line.startswith('data: '):
-                            line = line[6:]  # Remove "data: " prefix
-                        
-                        # Skip empty lines or ping events
-                        if not line or line == 'event: ping':
-                            continue
-                            
-                        try:
-                            # Parse the JSON data
-                            data = json.loads(line)
-                            
-                            # Only collect text from "text_chunk" events
-                            if data.get("event") == "text_chunk":
-                                chunk_data = data.get("data", {}).get("text", "")
-                                text_chunks.append(chunk_data)
-                        except json.JSONDecodeError:
-                            # Skip lines that aren't valid JSON
+                    for event in iter_sse_events(trace.wrap(response.iter_content(chunk_size=None))):
+                        # Only collect text from "text_chunk" events
+                        text = text_of(event)
+                        if text is not None:
+                            trace.text()
+                            text_chunks.append(text)
                             continue
+                        failure = failure_of(event)
+                        if failure is not None:
+                            raise WorkflowRunError(failure)
 
                     result = "".join(text_chunks)
                     print(f"工作流调用成功 (streaming模式)，返回文本长度: {len(result)}")
-                    return result
+                    trace.finish()
+                    return result, None
+                
+            except WorkflowRunError as e:
+                # 工作流本身运行失败，重新运行同样的输入需要再次消耗LLM调用，交由上层决定
+                last_error = e
+                retry_count += 1
+                trace.failure(e)
+                print(f"工作流运行失败 (不重试): {e}")
+                break
                 
             except requests.exceptions.Timeout as e:
                 last_error = e
                 retry_count += 1
+                trace.failure(e)
                 print(f"请求超时 (第 {retry_count} 次尝试): {e}")
                 
                 if retry_count > self.max_retries:
                     break
                     
                 # 对于超时错误，使用更长的等待时间
-                delay = min(self.max_delay, self.base_delay * (2 ** retry_count))
-                jitter = random.uniform(0, 0.1 * delay)
-                sleep_time = delay + jitter
-                
-                print(f"等待 {sleep_time:.2f} 秒后重试...")
-                time.sleep(sleep_time)
+                trace.backoff(self._sleep_before_retry(retry_count))
                 
             except requests.exceptions.HTTPError as e:
                 last_error = e
                 retry_count += 1
+                trace.failure(e)
                 
                 # 检查是否是504错误
                 if hasattr(e, 'response') and e.response.status_code == 504:
@@ -172,12 +195,7 @@ class DifyHelper:
                         break
                         
                     # 对于504错误，使用指数退避
-                    delay = min(self.max_delay, self.base_delay * (2 ** retry_count))
-                    jitter = random.uniform(0, 0.1 * delay)
-                    sleep_time = delay + jitter
-                    
-                    print(f"等待 {sleep_time:.2f} 秒后重试...")
-                    time.sleep(sleep_time)
+                    trace.backoff(self._sleep_before_retry(retry_count))
                 else:
                     # 其他HTTP错误不重试
                     print(f"HTTP错误 (不重试): {e}")
@@ -186,26 +204,136 @@ class DifyHelper:
             except (requests.exceptions.RequestException, json.JSONDecodeError, KeyError) as e:
                 last_error = e
                 retry_count += 1
+                trace.failure(e)
                 print(f"请求异常 (第 {retry_count} 次尝试): {e}")
                 
                 if retry_count > self.max_retries:
                     break
                 
                 # Calculate delay with exponential backoff and jitter
-                delay = min(self.max_delay, self.base_delay * (2 ** (retry_count - 1)))
-                jitter = random.uniform(0, 0.1 * delay)
-                sleep_time = delay + jitter
-                
-                print(f"等待 {sleep_time:.2f} 秒后重试...")
-                time.sleep(sleep_time)
+                trace.backoff(self._sleep_before_retry(retry_count - 1))
         
+        trace.finish(last_error)
         # 所有重试都失败了
         print(f"所有 {self.max_retries} 次重试都失败了。最后的错误: {last_error}")
         if 'response' in locals() and hasattr(response, 'text'):
             print(f"最后的响应: {response.text[:500]}...")
             
         # Return a result with the original content as translation as fallback
-        return "" if response_mode == 'streaming' else {}
+        return ("" if response_mode == 'streaming' else {}), last_error
+    
+    def stream_workflow(self, record: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Invoke the workflow in streaming mode and yield events as they arrive.
+        
+        Text chunks and node/workflow events are yielded as parsed dicts (ping
+        keep-alives are dropped). Connection failures, timeouts and 504s are
+        retried with the same backoff as invoke_workflow as long as nothing has
+        been yielded yet; once output has been handed to the caller the stream
+        cannot be replayed, so later errors are raised. A run that Dify reports
+        as failed inside the stream raises WorkflowRunError and is not retried.
+        
+        Args:
+            record: The input data for the workflow
+            
+        Yields:
+            SSE events, e.g. {"event": "text_chunk", "data": {"text": ...}}
+        """
+        headers = {
+            "Authorization": f"Bearer {self.workflow_api_key}", 
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+            "User-Agent": "genai-insight/1.0"
+        }
+        payload = {
+            "inputs": record,
+            "response_mode": "streaming",
+            "user": "genai-insight"
+        }
+        
+        retry_count = 0
+        last_error = None
+        trace = self._trace("streaming")
+        
+        while retry_count <= self.max_retries:
+            yielded = False
+            try:
+                print(f"尝试调用工作流 (第 {retry_count + 1} 次)...")
+                trace.attempt()
+                with self.session.post(
+                    self.workflow_api_url, 
+                    headers=headers, 
+                    data=json.dumps(payload), 
+                    timeout=self.timeout, 
+                    stream=True
+                ) as response:
+                    response.raise_for_status()
+                    for event in iter_sse_events(trace.wrap(response.iter_content(chunk_size=None))):
+                        if text_of(event) is not None:
+                            trace.text()
+                        else:
+                            failure = failure_of(event)
+                            if failure is not None:
+                                raise WorkflowRunError(failure)
+                        yielded = True
+                        yield event
+                trace.finish()
+                return
+            except WorkflowRunError as e:
+                trace.failure(e)
+                trace.finish(e)
+                raise
+            except requests.exceptions.RequestException as e:
+                trace.failure(e)
+                if yielded:
+                    trace.finish(e)
+                    raise
+                last_error = e
+                retry_count += 1
+                exponent = self._retry_exponent(e, retry_count)
+                if exponent is None:
+                    print(f"HTTP错误 (不重试): {e}")
+                    break
+                print(f"请求异常 (第 {retry_count} 次尝试): {e}")
+                if retry_count > self.max_retries:
+                    break
+                
+                trace.backoff(self._sleep_before_retry(exponent))
+        
+        trace.finish(last_error)
+        print(f"所有 {self.max_retries} 次重试都失败了。最后的错误: {last_error}")
+        raise last_error
+    
+    def _trace(self, response_mode: str):
+        if self.instrumentation is None:
+            return NOOP_TRACE
+        return self.instrumentation.start_call(response_mode)
+    
+    def _sleep_before_retry(self, exponent: int) -> float:
+        """
+        Sleep with exponential backoff and jitter, return the time slept.
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** exponent))
+        jitter = random.uniform(0, 0.1 * delay)
+        sleep_time = delay + jitter
+        
+        print(f"等待 {sleep_time:.2f} 秒后重试...")
+        time.sleep(sleep_time)
+        return sleep_time
+    
+    @staticmethod
+    def _retry_exponent(error: Exception, retry_count: int) -> Optional[int]:
+        """
+        Backoff exponent for an error under the invoke_workflow retry rules,
+        or None if the error must not be retried.
+        """
+        if isinstance(error, requests.exceptions.Timeout):
+            return retry_count
+        if isinstance(error, requests.exceptions.HTTPError):
+            if error.response is not None and error.response.status_code == 504:
+                return retry_count
+            return None
+        return retry_count - 1
     
     def close(self):
         """
@@ -224,4 +352,164 @@ class DifyHelper:
         """
         上下文管理器出口，自动关闭会话
         """
-        self.close()
\ No newline at end of file
+        self.close()
+
+
+class ClientRegistry:
+    """
+    进程内共享的DifyHelper注册表
+
+    requests.Session 不保证线程安全，因此每个线程为每个 (workflow_api_url, workflow_api_key,
+    DifyHelper参数) 保留一个自己的DifyHelper，同一线程内的各次调用之间连接池保持温热，
+    不必每次重新建立TCP/TLS连接。
+
+    相同 (工作流, response_mode, 重试/超时参数, 规范化后的输入) 的并发调用会合并：第一个调用者
+    执行上游请求，其余调用者（包括其他线程和asyncio协程）等待并得到同一个结果。重试参数不同的
+    调用不会合并，例如 invoke_slow_workflow (max_retries=5) 不会拿到 JobScheduler 单次尝试的504。调用结束后即从in-flight表中
+    移除，之后的调用会重新执行。传入 cache 时还会通过 WorkflowResultCache.run_exclusive
+    与其他进程中的相同调用去重，并由本注册表记录结果。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._helpers: List[DifyHelper] = []
+        self._in_flight: Dict[str, Future] = {}
+        self._closed = False
+
+    def get(self, workflow_api_key: str, workflow_api_url: str = WORKFLOW_URL, instrumentation: Optional[Instrumentation] = None, **helper_kwargs) -> DifyHelper:
+        """
+        获取当前线程中 (workflow_api_url, workflow_api_key, helper_kwargs) 对应的DifyHelper，不存在时创建
+
+        Args:
+            helper_kwargs: 透传给DifyHelper的参数，例如 max_retries、timeout
+        """
+        helpers = getattr(self._local, 'helpers', None)
+        if helpers is None:
+            helpers = self._local.helpers = {}
+        key = (workflow_api_url, workflow_api_key, tuple(sorted(helper_kwargs.items())))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ClientRegistry已关闭")
+            helper = helpers.get(key)
+            if helper is None:
+                helper = DifyHelper(workflow_api_url=workflow_api_url, workflow_api_key=workflow_api_key, instrumentation=instrumentation, **helper_kwargs)
+                helpers[key] = helper
+                self._helpers.append(helper)
+            elif helper.instrumentation is None and instrumentation is not None:
+                helper.instrumentation = instrumentation
+            return helper
+
+    @staticmethod
+    def _call_key(workflow_api_url: str, workflow_api_key: str, response_mode: str, helper_kwargs: Dict[str, Any], record: Dict[str, Any]) -> str:
+        # 重试/超时参数不同的调用结果不可互换（单次尝试的504不能作为max_retries=5的最终结果）
+        return cache_key(f"{workflow_api_url}|{workflow_api_key}|{response_mode}|{sorted(helper_kwargs.items())}", record)
+
+    def _join(self, key: str) -> Tuple[bool, Future]:
+        # 返回 (是否由调用者执行, 共享的Future)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return False, future
+            future = self._in_flight[key] = Future()
+            return True, future
+
+    def _settle(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def invoke_result(self, record: Dict[str, Any], workflow_api_key: str, workflow_api_url: str = WORKFLOW_URL, response_mode: str = "streaming", instrumentation: Optional[Instrumentation] = None, cache: Optional[WorkflowResultCache] = None, workflow: Optional[str] = None, **helper_kwargs) -> Tuple[Union[Dict, str], Optional[Exception]]:
+        """
+        调用工作流，与正在进行的相同调用合并
+
+        Args:
+            cache: 若提供，与其他进程中的相同调用去重，并把结果记录到缓存
+            workflow: 工作流名称（缓存中的键），提供 cache 时必填
+            helper_kwargs: 透传给DifyHelper的参数
+
+        Returns:
+            与 DifyHelper.invoke_workflow_result 相同的 (output, error)
+        """
+        if cache is not None and not workflow:
+            raise ValueError("使用cache时必须提供workflow名称")
+        key = self._call_key(workflow_api_url, workflow_api_key, response_mode, helper_kwargs, record)
+
+        owner, future = self._join(key)
+        if not owner:
+            print("相同输入的工作流调用正在进行，等待其结果...")
+            return future.result()
+
+        def run() -> Tuple[Union[Dict, str], Optional[Exception]]:
+            helper = self.get(workflow_api_key, workflow_api_url, instrumentation, **helper_kwargs)
+            return helper.invoke_workflow_result(record, response_mode=response_mode)
+
+        try:
+            result = run() if cache is None else cache.run_exclusive(workflow, record, run)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def ainvoke_result(self, helper: Any, record: Dict[str, Any], response_mode: str = "streaming", cache: Optional[WorkflowResultCache] = None, workflow: Optional[str] = None) -> Tuple[Union[Dict, str], Optional[Exception]]:
+        """
+        invoke_result 的asyncio版本，使用调用方的 AsyncDifyHelper（aiohttp会话绑定在事件循环上，不在注册表中保存）
+
+        与本进程中其他线程/协程、以及（提供 cache 时）其他进程中的相同调用合并。
+        """
+        if cache is not None and not workflow:
+            raise ValueError("使用cache时必须提供workflow名称")
+        key = self._call_key(helper.workflow_api_url, helper.workflow_api_key, response_mode, {"max_retries": helper.max_retries, "timeout": helper.timeout}, record)
+
+        owner, future = self._join(key)
+        if not owner:
+            print("相同输入的工作流调用正在进行，等待其结果...")
+            return await asyncio.wrap_future(future)
+
+        def run() -> Awaitable[Tuple[Union[Dict, str], Optional[Exception]]]:
+            return helper.invoke_workflow_result(record, response_mode=response_mode)
+
+        try:
+            result = await run() if cache is None else await cache.arun_exclusive(workflow, record, run)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def invoke(self, record: Dict[str, Any], workflow_api_key: str, workflow_api_url: str = WORKFLOW_URL, response_mode: str = "streaming", instrumentation: Optional[Instrumentation] = None, **kwargs) -> Union[Dict, str]:
+        """
+        与 invoke_result 相同，只返回输出
+        """
+        result, _ = self.invoke_result(record, workflow_api_key, workflow_api_url, response_mode, instrumentation, **kwargs)
+        return result
+
+    def release_thread(self):
+        """
+        关闭当前线程的所有DifyHelper（工作线程退出前调用）
+        """
+        helpers = getattr(self._local, 'helpers', None) or {}
+        self._local.helpers = {}
+        with self._lock:
+            released = set(map(id, helpers.values()))
+            self._helpers = [helper for helper in self._helpers if id(helper) not in released]
+        for helper in helpers.values():
+            helper.close()
+
+    def close(self):
+        """
+        关闭所有线程的会话；之后的调用会抛出RuntimeError
+        """
+        with self._lock:
+            self._closed = True
+            helpers, self._helpers = self._helpers, []
+        for helper in helpers:
+            helper.close()
+
+
+client_registry = ClientRegistry()
+atexit.register(client_registry.close)
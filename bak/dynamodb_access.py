@@ -0,0 +1,339 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RAW_DATA_TABLE = 'github-insight-raw-data'
+TREND_CANDIDATES_TABLE = 'github-trend-repo-candidates'
+WATCHLIST_TABLE = 'genai-repo-watchlist'
+
+# 表名 -> (分区键, 排序键)
+TABLE_KEYS: Dict[str, Tuple[str, Optional[str]]] = {
+    RAW_DATA_TABLE: ('project_url', 'collect_date'),
+    TREND_CANDIDATES_TABLE: ('project_url', 'collect_date'),
+    WATCHLIST_TABLE: ('project_url', None),
+}
+
+# DynamoDB单次批量请求的上限
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+
+
+class Boto3Backend:
+    """
+    基于boto3的DynamoDB后端
+
+    DynamoDBAccess 会在多个线程中并行调用本后端：boto3的client是线程安全的，resource/Table
+    不是，因此所有请求都直接通过 client 发送，条件表达式在每次调用时单独序列化。
+    """
+
+    def __init__(self, region: str = 'us-east-1'):
+        import boto3
+
+        # resource 的 client 会自动完成Python类型与DynamoDB类型的转换
+        self.resource = boto3.resource('dynamodb', region_name=region)
+        self.client = self.resource.meta.client
+
+    @staticmethod
+    def _projection_kwargs(projection: Optional[List[str]]) -> Dict[str, Any]:
+        if not projection:
+            return {}
+        names = {f"#p{i}": name for i, name in enumerate(projection)}
+        return {'ProjectionExpression': ", ".join(names), 'ExpressionAttributeNames': names}
+
+    def batch_write(self, request_items: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        response = self.client.batch_write_item(RequestItems=request_items)
+        return response.get('UnprocessedItems', {})
+
+    def batch_get(self, request_items: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Dict[str, Any]]]:
+        response = self.client.batch_get_item(RequestItems=request_items)
+        return response.get('Responses', {}), response.get('UnprocessedKeys', {})
+
+    def query_page(self, table: str, partition_key: str, partition_value: Any, sort_key: Optional[str], sort_after: Optional[Any], sort_until: Optional[Any], projection: Optional[List[str]], start_key: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        from boto3.dynamodb.conditions import ConditionExpressionBuilder, Key
+
+        condition = Key(partition_key).eq(partition_value)
+        if sort_key is not None and sort_after is not None and sort_until is not None:
+            # BETWEEN 包含下界，等于 sort_after 的记录由 DynamoDBAccess.iter_query 过滤掉
+            condition = condition & Key(sort_key).between(sort_after, sort_until)
+        elif sort_key is not None and sort_after is not None:
+            condition = condition & Key(sort_key).gt(sort_after)
+        elif sort_key is not None and sort_until is not None:
+            condition = condition & Key(sort_key).lte(sort_until)
+
+        # client 自动构建条件表达式时共用同一个builder，并发调用会互相覆盖占位符，因此在这里单独构建
+        built = ConditionExpressionBuilder().build_expression(condition, is_key_condition=True)
+        kwargs: Dict[str, Any] = self._projection_kwargs(projection)
+        kwargs['KeyConditionExpression'] = built.condition_expression
+        kwargs['ExpressionAttributeNames'] = {**kwargs.get('ExpressionAttributeNames', {}), **built.attribute_name_placeholders}
+        kwargs['ExpressionAttributeValues'] = built.attribute_value_placeholders
+        if start_key is not None:
+            kwargs['ExclusiveStartKey'] = start_key
+
+        response = self.client.query(TableName=table, **kwargs)
+        return response.get('Items', []), response.get('LastEvaluatedKey')
+
+    def scan_page(self, table: str, projection: Optional[List[str]], start_key: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        kwargs: Dict[str, Any] = self._projection_kwargs(projection)
+        if start_key is not None:
+            kwargs['ExclusiveStartKey'] = start_key
+
+        response = self.client.scan(TableName=table, **kwargs)
+        return response.get('Items', []), response.get('LastEvaluatedKey')
+
+
+class InMemoryBackend:
+    """
+    内存中的DynamoDB替身，用于离线测试和吞吐量基准
+
+    可以模拟每次请求的网络延迟、分页大小，以及批量请求中一定比例的未处理项
+    (UnprocessedItems/UnprocessedKeys)，以覆盖重试逻辑。
+    """
+
+    def __init__(self, latency: float = 0.0, page_size: int = 1000, unprocessed_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            latency: 每次请求的模拟延迟（秒）
+            page_size: query/scan每页的最大条数
+            unprocessed_rate: 批量请求中每一项被退回为未处理的概率
+            seed: 随机数种子
+        """
+        self.latency = latency
+        self.page_size = page_size
+        self.unprocessed_rate = unprocessed_rate
+        # 表名 -> 分区键的值 -> 排序键的值 -> item
+        self.tables: Dict[str, Dict[Any, Dict[Any, Dict[str, Any]]]] = {}
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _key(self, table: str, item: Dict[str, Any]) -> Tuple[Any, Any]:
+        partition_key, sort_key = TABLE_KEYS[table]
+        return item[partition_key], item.get(sort_key) if sort_key else None
+
+    def _request(self):
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _rejected(self) -> bool:
+        with self._lock:
+            return self.unprocessed_rate > 0 and self._random.random() < self.unprocessed_rate
+
+    @staticmethod
+    def _project(item: Dict[str, Any], projection: Optional[List[str]]) -> Dict[str, Any]:
+        if not projection:
+            return dict(item)
+        return {name: item[name] for name in projection if name in item}
+
+    def batch_write(self, request_items: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        self._request()
+        unprocessed: Dict[str, List[Dict[str, Any]]] = {}
+        for table, requests in request_items.items():
+            for request in requests:
+                if self._rejected():
+                    unprocessed.setdefault(table, []).append(request)
+                    continue
+                with self._lock:
+                    partitions = self.tables.setdefault(table, {})
+                    if 'PutRequest' in request:
+                        item = dict(request['PutRequest']['Item'])
+                        partition, sort = self._key(table, item)
+                        partitions.setdefault(partition, {})[sort] = item
+                    else:
+                        partition, sort = self._key(table, request['DeleteRequest']['Key'])
+                        partitions.get(partition, {}).pop(sort, None)
+        return unprocessed
+
+    def batch_get(self, request_items: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Dict[str, Any]]]:
+        self._request()
+        responses: Dict[str, List[Dict[str, Any]]] = {}
+        unprocessed: Dict[str, Dict[str, Any]] = {}
+        for table, request in request_items.items():
+            projection = list(request.get('ExpressionAttributeNames', {}).values()) or None
+            responses.setdefault(table, [])
+            for key in request['Keys']:
+                if self._rejected():
+                    pending = unprocessed.setdefault(table, {k: v for k, v in request.items() if k != 'Keys'})
+                    pending.setdefault('Keys', []).append(key)
+                    continue
+                partition, sort = self._key(table, key)
+                with self._lock:
+                    item = self.tables.get(table, {}).get(partition, {}).get(sort)
+                if item is not None:
+                    responses[table].append(self._project(item, projection))
+        return responses, unprocessed
+
+    def _page(self, table: str, rows: List[Dict[str, Any]], projection: Optional[List[str]], start_key: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        offset = int(start_key['_offset']) if start_key is not None else 0
+        page = rows[offset:offset + self.page_size]
+        last_key = {'_offset': offset + self.page_size} if offset + self.page_size < len(rows) else None
+        return [self._project(item, projection) for item in page], last_key
+
+    def query_page(self, table: str, partition_key: str, partition_value: Any, sort_key: Optional[str], sort_after: Optional[Any], sort_until: Optional[Any], projection: Optional[List[str]], start_key: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        self._request()
+        with self._lock:
+            partition = self.tables.get(table, {}).get(partition_value, {})
+            rows = [
+                partition[sort] for sort in sorted(partition, key=lambda value: (value is not None, value))
+                if (sort_after is None or sort > sort_after) and (sort_until is None or sort <= sort_until)
+            ]
+        return self._page(table, rows, projection, start_key)
+
+    def scan_page(self, table: str, projection: Optional[List[str]], start_key: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        self._request()
+        with self._lock:
+            rows = [item for partition in self.tables.get(table, {}).values() for item in partition.values()]
+        return self._page(table, rows, projection, start_key)
+
+
+class DynamoDBAccess:
+    """
+    github-insight-raw-data / github-trend-repo-candidates / genai-repo-watchlist 的数据访问层
+
+    - batch_put / batch_get: 自动按DynamoDB上限分批、并行发送，并带退避地重试未处理项
+    - query_many: 并行查询多个分区键
+    - iter_query / iter_scan: 按页流式返回，不会一次性加载整张表
+    """
+
+    def __init__(self, backend=None, region: str = 'us-east-1', max_workers: int = 8, max_attempts: int = 8, base_delay: float = 0.05, max_delay: float = 5.0):
+        """
+        Args:
+            backend: Boto3Backend 或 InMemoryBackend，默认使用 Boto3Backend(region)
+            region: DynamoDB所在区域
+            max_workers: 并行请求数 (default: 8)
+            max_attempts: 未处理项的最大重试轮数 (default: 8)
+            base_delay: 未处理项重试的初始等待时间（秒）
+            max_delay: 最大等待时间（秒）
+        """
+        self.backend = backend if backend is not None else Boto3Backend(region)
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _sleep_before_retry(self, attempt: int):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        time.sleep(delay + random.uniform(0, 0.1 * delay))
+
+    def _map(self, func, chunks: List[Any]) -> List[Any]:
+        if len(chunks) <= 1 or self.max_workers <= 1:
+            return [func(chunk) for chunk in chunks]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, chunks))
+
+    def batch_put(self, table: str, items: List[Dict[str, Any]]) -> int:
+        """
+        批量写入，每批最多25条，多批并行
+
+        Returns:
+            写入的条数
+
+        Raises:
+            RuntimeError: 重试 max_attempts 轮后仍有未处理项
+        """
+        # 同一批中不能出现重复的键，后写入的覆盖先写入的
+        partition_key, sort_key = TABLE_KEYS[table]
+        unique = {(item[partition_key], item.get(sort_key) if sort_key else None): item for item in items}
+        requests = [{'PutRequest': {'Item': item}} for item in unique.values()]
+        chunks = [requests[i:i + BATCH_WRITE_LIMIT] for i in range(0, len(requests), BATCH_WRITE_LIMIT)]
+
+        def write_chunk(chunk: List[Dict[str, Any]]) -> int:
+            pending = {table: chunk}
+            for attempt in range(self.max_attempts):
+                pending = self.backend.batch_write(pending)
+                if not pending.get(table):
+                    return len(chunk)
+                self._sleep_before_retry(attempt)
+            raise RuntimeError(f"批量写入 {table} 失败: {len(pending[table])} 条未处理")
+
+        return sum(self._map(write_chunk, chunks))
+
+    def batch_get(self, table: str, keys: List[Dict[str, Any]], projection: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        批量读取，每批最多100个键，多批并行；返回顺序不保证与keys一致
+
+        Raises:
+            RuntimeError: 重试 max_attempts 轮后仍有未处理的键
+        """
+        partition_key, sort_key = TABLE_KEYS[table]
+        unique = list({(key[partition_key], key.get(sort_key) if sort_key else None): key for key in keys}.values())
+        chunks = [unique[i:i + BATCH_GET_LIMIT] for i in range(0, len(unique), BATCH_GET_LIMIT)]
+
+        def read_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            request: Dict[str, Any] = {'Keys': chunk}
+            if projection:
+                names = {f"#p{i}": name for i, name in enumerate(projection)}
+                request['ProjectionExpression'] = ", ".join(names)
+                request['ExpressionAttributeNames'] = names
+
+            items: List[Dict[str, Any]] = []
+            pending = {table: request}
+            for attempt in range(self.max_attempts):
+                responses, pending = self.backend.batch_get(pending)
+                items.extend(responses.get(table, []))
+                if not pending.get(table):
+                    return items
+                self._sleep_before_retry(attempt)
+            raise RuntimeError(f"批量读取 {table} 失败: {len(pending[table]['Keys'])} 个键未处理")
+
+        return [item for items in self._map(read_chunk, chunks) for item in items]
+
+    def iter_query(self, table: str, partition_value: Any, sort_after: Optional[Any] = None, sort_until: Optional[Any] = None, projection: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        按页流式查询一个分区
+
+        Args:
+            table: 表名
+            partition_value: 分区键的值，例如project_url
+            sort_after: 只返回排序键严格大于该值的记录
+            sort_until: 只返回排序键小于等于该值的记录
+            projection: 只返回这些属性
+        """
+        partition_key, sort_key = TABLE_KEYS[table]
+        start_key = None
+        while True:
+            items, start_key = self.backend.query_page(table, partition_key, partition_value, sort_key, sort_after, sort_until, projection, start_key)
+            for item in items:
+                if sort_after is not None and sort_key and item.get(sort_key, sort_after) == sort_after:
+                    continue
+                yield item
+            if start_key is None:
+                return
+
+    def query_many(self, table: str, partition_values: List[Any], sort_after: Optional[Dict[Any, Any]] = None, sort_until: Optional[Any] = None, projection: Optional[List[str]] = None) -> Dict[Any, List[Dict[str, Any]]]:
+        """
+        并行查询多个分区
+
+        Args:
+            table: 表名
+            partition_values: 分区键的值列表
+            sort_after: 分区键 -> 排序键下界（不含），例如每个repo的同步高水位
+            sort_until: 所有分区共用的排序键上界（含）
+            projection: 只返回这些属性
+
+        Returns:
+            分区键 -> 记录列表
+        """
+        sort_after = sort_after or {}
+
+        def query_one(value: Any) -> List[Dict[str, Any]]:
+            return list(self.iter_query(table, value, sort_after.get(value), sort_until, projection))
+
+        return dict(zip(partition_values, self._map(query_one, list(partition_values))))
+
+    def iter_scan(self, table: str, projection: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        按页流式扫描整张表，任何时刻只在内存中保留一页
+        """
+        start_key = None
+        while True:
+            items, start_key = self.backend.scan_page(table, projection, start_key)
+            yield from items
+            if start_key is None:
+                return
@@ -0,0 +1,213 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+
+@dataclass
+class FakeDifyConfig:
+    """
+    本地假Dify服务的行为参数
+
+    流式响应依次发送 workflow_started、若干 text_chunk、workflow_finished；
+    等待首个text_chunk期间按 ping_interval 发送 ping，与Dify的保活行为一致。
+    """
+    # 首个text_chunk前的等待时间（模拟排队和前置节点），秒
+    first_chunk_latency: float = 0.05
+    # 相邻text_chunk之间的间隔（模拟LLM生成速度），秒
+    chunk_interval: float = 0.005
+    # 每个text_chunk的字符数
+    chunk_size: int = 64
+    # 输出文本的总字符数
+    payload_size: int = 4096
+    # 等待期间的ping间隔，0表示不发送
+    ping_interval: float = 0.0
+    # 注入504的概率
+    error_rate_504: float = 0.0
+    # 注入超时的概率：连接建立后 hang_seconds 内不返回任何字节
+    timeout_rate: float = 0.0
+    hang_seconds: float = 5.0
+    seed: Optional[int] = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: 'FakeDifyServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            self._send_json(400, {"code": "invalid_param", "message": "invalid json"})
+            return
+
+        config = self.server.config
+        fault = self.server.draw_fault()
+        if fault == '504':
+            self._send_json(504, {"message": "Gateway Timeout"})
+            return
+        if fault == 'timeout':
+            time.sleep(config.hang_seconds)
+            self.close_connection = True
+            return
+
+        text = self.server.make_text(payload.get("inputs", {}))
+        if payload.get("response_mode") == "blocking":
+            time.sleep(config.first_chunk_latency + config.chunk_interval * max(0, len(text) // max(config.chunk_size, 1) - 1))
+            self._send_json(200, {"workflow_run_id": str(uuid.uuid4()), "data": {"status": "succeeded", "outputs": {"text": text}}})
+            return
+        try:
+            self._stream(text)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开（例如读超时或取消），停止发送即可
+            self.close_connection = True
+
+    def _send_json(self, status: int, data: Dict[str, Any]):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        # Transfer-Encoding: chunked
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _event(self, data: Dict[str, Any]) -> bytes:
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+    def _stream(self, text: str):
+        config = self.server.config
+        run_id = str(uuid.uuid4())
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        self._write_chunk(self._event({"event": "workflow_started", "workflow_run_id": run_id, "data": {"id": run_id}}))
+        deadline = time.monotonic() + config.first_chunk_latency
+        while config.ping_interval > 0 and time.monotonic() + config.ping_interval < deadline:
+            time.sleep(config.ping_interval)
+            self._write_chunk(b"event: ping\n\n")
+        time.sleep(max(0.0, deadline - time.monotonic()))
+
+        step = max(config.chunk_size, 1)
+        for start in range(0, len(text), step):
+            if start:
+                time.sleep(config.chunk_interval)
+            self._write_chunk(self._event({
+                "event": "text_chunk",
+                "workflow_run_id": run_id,
+                "data": {"text": text[start:start + step], "from_variable_selector": ["llm", "text"]}
+            }))
+
+        self._write_chunk(self._event({"event": "workflow_finished", "workflow_run_id": run_id, "data": {"id": run_id, "status": "succeeded", "outputs": {"text": text}}}))
+        self._write_chunk(b"")
+
+
+class FakeDifyServer(ThreadingHTTPServer):
+    """
+    本地替身 /v1/workflows/run，用于离线基准测试
+
+    Example:
+        with FakeDifyServer(FakeDifyConfig(error_rate_504=0.1)) as server:
+            DifyHelper(workflow_api_url=server.url, workflow_api_key="test").invoke_workflow({...})
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, config: Optional[FakeDifyConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.config = config or FakeDifyConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"requests": 0, "injected_504": 0, "injected_timeout": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/workflows/run"
+
+    def draw_fault(self) -> Optional[str]:
+        with self._lock:
+            self.stats["requests"] += 1
+            value = self._random.random()
+            if value < self.config.error_rate_504:
+                self.stats["injected_504"] += 1
+                return '504'
+            if value < self.config.error_rate_504 + self.config.timeout_rate:
+                self.stats["injected_timeout"] += 1
+                return 'timeout'
+        return None
+
+    def make_text(self, inputs: Dict[str, Any]) -> str:
+        # 输出以输入开头，便于调用方核对结果
+        prefix = json.dumps(inputs, ensure_ascii=False)
+        size = max(self.config.payload_size, len(prefix))
+        return (prefix + "生成文本" * (size // 4 + 1))[:size]
+
+    def start(self) -> 'FakeDifyServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-dify', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeDifyConfig()
+    parser.add_argument('--first-chunk-latency', type=float, default=defaults.first_chunk_latency, help='首个text_chunk前的等待时间(秒)')
+    parser.add_argument('--chunk-interval', type=float, default=defaults.chunk_interval, help='text_chunk间隔(秒)')
+    parser.add_argument('--chunk-size', type=int, default=defaults.chunk_size, help='每个text_chunk的字符数')
+    parser.add_argument('--payload-size', type=int, default=defaults.payload_size, help='输出文本总字符数')
+    parser.add_argument('--ping-interval', type=float, default=defaults.ping_interval, help='ping间隔(秒)，0为不发送')
+    parser.add_argument('--error-rate-504', type=float, default=defaults.error_rate_504, help='注入504的概率')
+    parser.add_argument('--timeout-rate', type=float, default=defaults.timeout_rate, help='注入超时的概率')
+    parser.add_argument('--hang-seconds', type=float, default=defaults.hang_seconds, help='注入超时时挂起的时间(秒)')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+
+
+def config_from_args(args: argparse.Namespace) -> FakeDifyConfig:
+    return FakeDifyConfig(**{name: getattr(args, name) for name in asdict(FakeDifyConfig())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地假Dify工作流服务 (/v1/workflows/run)')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeDifyServer(config_from_args(args), args.host, args.port)
+    print(f"假Dify服务已启动: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Iterable, Optional
+from urllib.parse import urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: 'FakeGitHubServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = self.server.lookup(urlparse(self.path).path)
+        if body is None:
+            self.server.count('not_found')
+            self._send(404, json.dumps({"message": "Not Found"}).encode('utf-8'))
+            return
+
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        # 与GitHub一致使用弱ETag，响应体不变时ETag不变
+        etag = f'W/"{hashlib.sha1(data).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.server.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.server.count('ok')
+        self._send(200, data, etag)
+
+    def _send(self, status: int, data: bytes, etag: Optional[str] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeGitHubServer(ThreadingHTTPServer):
+    """
+    本地替身 GitHub REST API（/repos/{owner}/{repo}、/commits、/pulls），支持ETag条件请求
+
+    响应体未变化时对带 If-None-Match 的请求返回304，stats 中分别统计200/304/404的次数。
+
+    Example:
+        with FakeGitHubServer() as server:
+            server.set_repo('vllm-project/vllm', commit_dates=['2025-10-02T08:00:00Z'])
+            GitHubActivityClient(api_base_url=server.url, etag_store=ETagStore(':memory:')).filter_active([...], '2025-10-01')
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Handler)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # "owner/repo" -> {"repo": {...}, "commits": [...], "pulls": [...]}
+        self.repos: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"requests": 0, "ok": 0, "not_modified": 0, "not_found": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_repo(self, full_name: str, commit_dates: Iterable[str] = (), pull_dates: Iterable[str] = (), merged_dates: Iterable[Optional[str]] = (), stars: int = 0):
+        """
+        设置（或替换）一个repo的数据
+
+        Args:
+            full_name: owner/repo
+            commit_dates: 各commit的提交时间 (YYYY-MM-DDTHH:MM:SSZ)
+            pull_dates: 各PR的更新时间
+            merged_dates: 各PR的合并时间，与 pull_dates 一一对应，未合并为None
+            stars: star数
+        """
+        owner, name = full_name.lower().split('/')
+        merged_dates = list(merged_dates)
+        commits = [{"sha": f"{i:040x}", "commit": {"committer": {"date": date}}} for i, date in enumerate(commit_dates)]
+        pulls = [
+            {"number": i + 1, "updated_at": date, "merged_at": merged_dates[i] if i < len(merged_dates) else None}
+            for i, date in enumerate(pull_dates)
+        ]
+        with self._lock:
+            self.repos[f"{owner}/{name}"] = {
+                "repo": {"full_name": f"{owner}/{name}", "stargazers_count": stars},
+                "commits": commits,
+                "pulls": pulls,
+            }
+
+    def lookup(self, path: str) -> Optional[Any]:
+        parts = [part for part in path.strip('/').split('/') if part]
+        with self._lock:
+            self.stats["requests"] += 1
+            if len(parts) < 3 or parts[0] != 'repos':
+                return None
+            repo = self.repos.get(f"{parts[1]}/{parts[2]}".lower())
+            if repo is None:
+                return None
+            if len(parts) == 3:
+                return repo["repo"]
+            if len(parts) == 4 and parts[3] in ('commits', 'pulls'):
+                return repo[parts[3]]
+        return None
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def start(self) -> 'FakeGitHubServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-github', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API_URL = 'https://api.github.com'
+DEFAULT_ETAG_PATH = 'github_etags.sqlite3'
+
+
+def parse_repo(repo_url: str) -> Tuple[str, str]:
+    """
+    https://github.com/owner/repo(.git) -> ("owner", "repo")
+    """
+    path = urlparse(repo_url.strip()).path if '://' in repo_url else repo_url.strip()
+    parts = [part for part in path.strip('/').split('/') if part]
+    if len(parts) < 2:
+        raise ValueError(f"无法解析的repo地址: {repo_url}")
+    owner, name = parts[0], parts[1]
+    if name.endswith('.git'):
+        name = name[:-4]
+    return owner, name
+
+
+class ETagStore:
+    """
+    本地保存GitHub API响应的ETag/Last-Modified和响应体（SQLite）
+
+    命中304时直接复用本地保存的响应体，304响应不计入GitHub API的速率限制。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('GITHUB_ETAG_PATH', DEFAULT_ETAG_PATH)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS etags (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[Tuple[Optional[str], Optional[str], Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT etag, last_modified, body FROM etags WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], body: Any):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO etags (url, etag, last_modified, body, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, json.dumps(body, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class ActivitySummary:
+    repo: str
+    since: str
+    commits: int
+    pull_requests: int
+    merged_pull_requests: int
+    # 第一页已全部落在统计区间内，实际数量可能更多
+    truncated: bool = False
+
+    @property
+    def active(self) -> bool:
+        return self.commits > 0 or self.pull_requests > 0
+
+
+class GitHubActivityClient:
+    """
+    以很低的成本获取repo在某日之后的活跃度（commit/PR数量），用于在运行LLM工作流之前
+    过滤掉没有任何变化的repo
+
+    请求的URL不随日期变化（按更新时间倒序取第一页后在本地过滤），因此同一个repo在
+    没有新提交/新PR时总会命中ETag，返回304。
+    """
+
+    def __init__(self, api_base_url: str = GITHUB_API_URL, token: Optional[str] = None, etag_store: Optional[ETagStore] = None, timeout: int = 30, per_page: int = 100):
+        """
+        Args:
+            api_base_url: GitHub API地址，测试时可指向本地的假服务
+            token: GitHub token，默认读取环境变量 GITHUB_TOKEN
+            etag_store: ETag存储，默认使用 ETagStore()
+            timeout: 请求超时时间（秒）
+            per_page: 每次请求的条数，最大100
+        """
+        self.api_base_url = api_base_url.rstrip('/')
+        self.token = token or os.getenv('GITHUB_TOKEN')
+        self.etag_store = etag_store or ETagStore()
+        self.timeout = timeout
+        self.per_page = per_page
+
+        # requests.Session 不保证线程安全，filter_active 等并发查询时每个线程使用自己的实例
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._sessions_lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                "Accept": "application/vnd.github+json",
+                "User-Agent": "genai-insight/1.0"
+            })
+            if self.token:
+                session.headers["Authorization"] = f"Bearer {self.token}"
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def _get(self, path: str, params: Dict[str, Any]) -> Any:
+        url = requests.Request('GET', f"{self.api_base_url}{path}", params=params).prepare().url
+
+        headers = {}
+        cached = self.etag_store.get(url)
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self._session().get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached is not None:
+            return cached[2]
+        response.raise_for_status()
+
+        body = response.json()
+        self.etag_store.put(url, response.headers.get('ETag'), response.headers.get('Last-Modified'), body)
+        return body
+
+    def activity_summary(self, repo_url: str, since: str) -> ActivitySummary:
+        """
+        统计 since (YYYY-MM-DD, UTC) 之后的commit数和PR数
+
+        Args:
+            repo_url: repo地址，例如 https://github.com/vllm-project/vllm
+            since: 起始日期，与工作流的 start_date 一致
+        """
+        owner, name = parse_repo(repo_url)
+        since_dt = datetime.strptime(since, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+        commits = self._get(f"/repos/{owner}/{name}/commits", {"per_page": self.per_page})
+        recent_commits = [c for c in commits if _is_after(c.get('commit', {}).get('committer', {}).get('date'), since_dt)]
+
+        pulls = self._get(f"/repos/{owner}/{name}/pulls", {"state": "all", "sort": "updated", "direction": "desc", "per_page": self.per_page})
+        recent_pulls = [p for p in pulls if _is_after(p.get('updated_at'), since_dt)]
+        merged = [p for p in recent_pulls if _is_after(p.get('merged_at'), since_dt)]
+
+        truncated = (len(commits) >= self.per_page and len(recent_commits) == len(commits)) or \
+                    (len(pulls) >= self.per_page and len(recent_pulls) == len(pulls))
+        return ActivitySummary(repo_url, since, len(recent_commits), len(recent_pulls), len(merged), truncated)
+
+    def stargazers_count(self, repo_url: str) -> int:
+        """
+        当前star数（repo信息接口，未变化时返回304）
+        """
+        owner, name = parse_repo(repo_url)
+        return int(self._get(f"/repos/{owner}/{name}", {}).get('stargazers_count') or 0)
+
+    def filter_active(self, repos: List[str], since: str, max_workers: int = 8) -> Tuple[List[str], List[str]]:
+        """
+        将repo分为有活动和无活动两组；查询失败的repo按有活动处理，不影响正常采集
+
+        只统计commit和PR，不包括新增issue和star（没有commit/PR的repo在周末等时候issue和star
+        仍可能变化）。跳过的repo当天没有快照，trend_metrics.daily_deltas 会用下一次快照与
+        最近一次有效快照相差，区间内的issue/star增量不会丢失，只是合并记在下一天。
+
+        Args:
+            repos: repo地址列表
+            since: 起始日期 (YYYY-MM-DD)
+            max_workers: 并发查询数 (default: 8)
+
+        Returns:
+            (active_repos, quiet_repos)，各自保持输入顺序
+        """
+        def check(repo: str) -> bool:
+            try:
+                summary = self.activity_summary(repo, since)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"获取活跃度失败，按有活动处理: {repo}, 错误: {e}")
+                return True
+            if not summary.active:
+                logger.info(f"{repo} 自 {since} 起没有新的commit/PR，跳过")
+            return summary.active
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            flags = list(executor.map(check, repos))
+
+        active = [repo for repo, flag in zip(repos, flags) if flag]
+        quiet = [repo for repo, flag in zip(repos, flags) if not flag]
+        return active, quiet
+
+    def close(self):
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self.etag_store.close()
+
+
+def _is_after(value: Optional[str], since: datetime) -> bool:
+    if not value:
+        return False
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc) >= since
@@ -0,0 +1,461 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 秒；覆盖从毫秒级的首字节到 timeout=900 的整次调用
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900, math.inf)
+
+# JobScheduler 每个任务的尝试次数
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, math.inf)
+
+# 与 DifyHelper 的重试规则对应的错误类别
+ERROR_CLASSES = ('timeout', '504', 'other')
+
+METRIC_HELP = {
+    'dify_workflow_calls_total': ('counter', '工作流调用次数（含所有重试，按最终结果计一次）'),
+    'dify_workflow_attempts_total': ('counter', 'HTTP请求次数'),
+    'dify_workflow_errors_total': ('counter', '失败的请求次数，按错误类别'),
+    'dify_workflow_backoff_seconds_total': ('counter', '重试前退避等待的总时间'),
+    'dify_workflow_chunks_total': ('counter', '收到的响应分块数'),
+    'dify_workflow_bytes_total': ('counter', '收到的响应字节数'),
+    'dify_workflow_duration_seconds': ('histogram', '整次调用耗时，包括重试和退避等待'),
+    'dify_workflow_ttfb_seconds': ('histogram', '请求发出到收到第一个响应字节的时间'),
+    'dify_workflow_first_text_seconds': ('histogram', '请求发出到收到第一个text_chunk的时间（Dify排队和前置节点）'),
+    'dify_workflow_stream_seconds': ('histogram', '第一个到最后一个响应字节的时间（LLM生成）'),
+    'dify_scheduler_requeues_total': ('counter', 'JobScheduler重新排队的次数，按失败原因'),
+    'dify_scheduler_requeue_delay_seconds_total': ('counter', '重新排队前等待的总时间（调度器的退避）'),
+    'dify_scheduler_cooldowns_total': ('counter', '限流器因过载进入冷却的次数'),
+    'dify_scheduler_cooldown_seconds_total': ('counter', '限流器冷却的总时间'),
+    'dify_scheduler_slot_wait_seconds': ('histogram', '工作线程等待并发槽位（含冷却）的时间'),
+    'dify_scheduler_job_attempts': ('histogram', '每个任务结束时的尝试次数'),
+}
+
+
+def error_class(error: Exception) -> str:
+    """
+    timeout / 504 / other，兼容 requests 和 aiohttp 的异常
+    """
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(error, 'status', None)
+    if status == 504:
+        return '504'
+    if isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError, TimeoutError)):
+        return 'timeout'
+    return 'other'
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        按桶上界估算分位数（落在 +Inf 桶时返回最大的有限上界）
+        """
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound if bound != math.inf else self.buckets[-2]
+        return self.buckets[-2]
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...], extra: str = '') -> str:
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    进程内的计数器和直方图，按 (指标名, 标签) 聚合，可导出为Prometheus文本格式
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: Dict[str, str], value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def render_prometheus(self) -> str:
+        """
+        Prometheus text exposition format (0.0.4)
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, list(h.buckets), list(h.counts), h.sum, h.count) for key, h in self._histograms.items()),
+                key=lambda item: item[0]
+            )
+
+        lines = []
+        described = set()
+
+        def describe(name: str):
+            if name not in described and name in METRIC_HELP:
+                kind, help_text = METRIC_HELP[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_label_text(labels)} {_format_value(value)}")
+        for (name, labels), buckets, counts, total, count in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{name}_bucket{_label_text(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+default_registry = MetricsRegistry()
+
+
+class JsonLinesSink:
+    """
+    每次调用结束后追加一行JSON
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict[str, Any], registry: MetricsRegistry):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+class PrometheusFileSink:
+    """
+    每次调用结束后把整个registry写入文本文件（node_exporter textfile collector 格式），
+    先写临时文件再替换，采集方不会读到写了一半的文件
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict[str, Any], registry: MetricsRegistry):
+        text = registry.render_prometheus()
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+
+
+def start_prometheus_server(port: int, host: str = '0.0.0.0', registry: Optional[MetricsRegistry] = None) -> ThreadingHTTPServer:
+    """
+    在后台线程中提供 /metrics
+    """
+    registry = registry or default_registry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='prometheus-metrics', daemon=True)
+    thread.start()
+    logger.info(f"Prometheus指标: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+class CallTrace:
+    """
+    一次工作流调用（包括所有重试）的计时和计数
+
+    时间都相对于当前这次HTTP请求的发出时间；只有成功的那次请求的时间会进入直方图。
+    """
+
+    def __init__(self, instrumentation: 'Instrumentation', response_mode: str):
+        self.instrumentation = instrumentation
+        self.response_mode = response_mode
+        self.started = time.monotonic()
+        self.attempts = 0
+        self.errors: Dict[str, int] = {}
+        self.backoff_seconds = 0.0
+        self.chunks = 0
+        self.bytes = 0
+        self._attempt_started = self.started
+        self.ttfb: Optional[float] = None
+        self.first_text: Optional[float] = None
+        self._last_byte: Optional[float] = None
+        self._finished = False
+
+    def attempt(self):
+        self.attempts += 1
+        self._attempt_started = time.monotonic()
+        self.ttfb = self.first_text = self._last_byte = None
+
+    def chunk(self, nbytes: int):
+        now = time.monotonic()
+        if self.ttfb is None:
+            self.ttfb = now - self._attempt_started
+        self._last_byte = now
+        self.chunks += 1
+        self.bytes += nbytes
+
+    def wrap(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.chunk(len(chunk))
+            yield chunk
+
+    async def awrap(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            self.chunk(len(chunk))
+            yield chunk
+
+    def text(self):
+        if self.first_text is None:
+            self.first_text = time.monotonic() - self._attempt_started
+
+    def failure(self, error: Exception):
+        name = error_class(error)
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def backoff(self, seconds: float):
+        self.backoff_seconds += seconds
+
+    def finish(self, error: Optional[Exception] = None):
+        if self._finished:
+            return
+        self._finished = True
+        self.instrumentation.record(self, error)
+
+    @property
+    def stream_seconds(self) -> Optional[float]:
+        if self.ttfb is None or self._last_byte is None:
+            return None
+        return self._last_byte - (self._attempt_started + self.ttfb)
+
+
+class _NoopTrace:
+    """
+    未配置instrumentation时使用，所有方法都不做任何事
+    """
+
+    def attempt(self):
+        pass
+
+    def chunk(self, nbytes: int):
+        pass
+
+    def wrap(self, chunks: Iterable[bytes]) -> Iterable[bytes]:
+        return chunks
+
+    def awrap(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        return chunks
+
+    def text(self):
+        pass
+
+    def failure(self, error: Exception):
+        pass
+
+    def backoff(self, seconds: float):
+        pass
+
+    def finish(self, error: Optional[Exception] = None):
+        pass
+
+
+NOOP_TRACE = _NoopTrace()
+
+
+class Instrumentation:
+    """
+    DifyHelper / AsyncDifyHelper 的指标采集
+
+    每次调用结束后更新registry（按workflow和response_mode分标签的计数器和延迟直方图），
+    并把本次调用的摘要交给各个sink。通过这些信号可以区分慢在Dify排队（first_text）、
+    LLM生成（stream）还是我们自己的重试（backoff / errors）。
+    """
+
+    def __init__(self, workflow: str = 'default', sinks: Optional[List[Any]] = None, registry: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            workflow: 工作流名称，作为指标的 workflow 标签
+            sinks: 带 emit(record, registry) 方法的对象，如 JsonLinesSink / PrometheusFileSink
+            registry: 指标registry，默认为进程内共享的 default_registry
+        """
+        self.workflow = workflow
+        self.sinks = list(sinks or [])
+        self.registry = registry or default_registry
+
+    def start_call(self, response_mode: str) -> CallTrace:
+        return CallTrace(self, response_mode)
+
+    def record(self, trace: CallTrace, error: Optional[Exception]):
+        duration = time.monotonic() - trace.started
+        status = 'success' if error is None else 'error'
+        labels = {'workflow': self.workflow, 'response_mode': trace.response_mode}
+
+        registry = self.registry
+        registry.inc('dify_workflow_calls_total', {**labels, 'status': status})
+        registry.inc('dify_workflow_attempts_total', labels, trace.attempts)
+        for name, count in trace.errors.items():
+            registry.inc('dify_workflow_errors_total', {**labels, 'error_class': name}, count)
+        registry.inc('dify_workflow_backoff_seconds_total', labels, trace.backoff_seconds)
+        registry.inc('dify_workflow_chunks_total', labels, trace.chunks)
+        registry.inc('dify_workflow_bytes_total', labels, trace.bytes)
+        registry.observe('dify_workflow_duration_seconds', {**labels, 'status': status}, duration)
+        if error is None:
+            if trace.ttfb is not None:
+                registry.observe('dify_workflow_ttfb_seconds', labels, trace.ttfb)
+            if trace.first_text is not None:
+                registry.observe('dify_workflow_first_text_seconds', labels, trace.first_text)
+            if trace.stream_seconds is not None:
+                registry.observe('dify_workflow_stream_seconds', labels, trace.stream_seconds)
+
+        if not self.sinks:
+            return
+        record = {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "workflow": self.workflow,
+            "response_mode": trace.response_mode,
+            "status": status,
+            "error_class": error_class(error) if error is not None else None,
+            "error": str(error) if error is not None else None,
+            "duration": round(duration, 3),
+            "attempts": trace.attempts,
+            "errors": trace.errors,
+            "backoff_seconds": round(trace.backoff_seconds, 3),
+            "ttfb": _round(trace.ttfb),
+            "first_text": _round(trace.first_text),
+            "stream_seconds": _round(trace.stream_seconds),
+            "chunks": trace.chunks,
+            "bytes": trace.bytes,
+        }
+        for sink in self.sinks:
+            try:
+                sink.emit(record, registry)
+            except Exception as e:
+                # 指标输出失败不能影响工作流调用
+                logger.warning(f"指标输出失败 ({type(sink).__name__}): {e}")
+
+    # JobScheduler 以 max_retries=0 调用DifyHelper，每次调用的 attempts 恒为1、backoff 恒为0，
+    # 真正的重试和等待发生在调度器中，由以下方法记录
+
+    def record_requeue(self, reason: str, delay: float):
+        labels = {'workflow': self.workflow, 'reason': reason}
+        self.registry.inc('dify_scheduler_requeues_total', labels)
+        self.registry.inc('dify_scheduler_requeue_delay_seconds_total', labels, delay)
+
+    def record_cooldown(self, seconds: float):
+        labels = {'workflow': self.workflow}
+        self.registry.inc('dify_scheduler_cooldowns_total', labels)
+        self.registry.inc('dify_scheduler_cooldown_seconds_total', labels, seconds)
+
+    def record_slot_wait(self, seconds: float):
+        self.registry.observe('dify_scheduler_slot_wait_seconds', {'workflow': self.workflow}, seconds)
+
+    def record_job(self, attempts: int, error: Optional[Exception]):
+        status = 'success' if error is None else 'error'
+        self.registry.observe('dify_scheduler_job_attempts', {'workflow': self.workflow, 'status': status}, attempts, ATTEMPT_BUCKETS)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+_server_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def instrumentation_from_env(workflow: str) -> Optional[Instrumentation]:
+    """
+    根据环境变量创建Instrumentation，都未设置时返回None（不采集）
+
+    - INSTRUMENTATION_JSONL_PATH: 每次调用一行JSON的日志文件
+    - PROMETHEUS_TEXTFILE_PATH: Prometheus文本格式的指标文件
+    - PROMETHEUS_PORT: 在该端口提供 /metrics（每个进程只启动一次）
+    """
+    global _server
+    sinks = []
+    if os.getenv('INSTRUMENTATION_JSONL_PATH'):
+        sinks.append(JsonLinesSink(os.getenv('INSTRUMENTATION_JSONL_PATH')))
+    if os.getenv('PROMETHEUS_TEXTFILE_PATH'):
+        sinks.append(PrometheusFileSink(os.getenv('PROMETHEUS_TEXTFILE_PATH')))
+    port = os.getenv('PROMETHEUS_PORT')
+    if port:
+        with _server_lock:
+            if _server is None:
+                _server = start_prometheus_server(int(port))
+
+    if not sinks and not port:
+        return None
+    return Instrumentation(workflow, sinks=sinks)
@@ -0,0 +1,374 @@
+import heapq
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
+
+import requests
+
+from dify_helper import WORKFLOW_URL, client_registry
+from dynamodb_access import DynamoDBAccess, WATCHLIST_TABLE
+from github_activity import GitHubActivityClient
+from instrumentation import Instrumentation
+from result_cache import WorkflowResultCache
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_NAME = 'github_repo_analyze'
+
+
+def priority_rank(priority: Optional[str]) -> int:
+    """
+    将watchlist中的priority转换为排序值，越小越优先
+
+    Human-P0 < Human-P1 < ... < P0 < P1 < ... < 未设置
+    """
+    if not priority:
+        return 10000
+    match = re.search(r'P(\d+)', priority)
+    level = int(match.group(1)) if match else 100
+    # 人工指定的repo全部排在自动发现的repo之前
+    return (0 if priority.startswith('Human') else 1000) + level
+
+
+def load_watchlist(table_name: str = WATCHLIST_TABLE, region: str = 'us-east-1', access: Optional[DynamoDBAccess] = None) -> List[Dict[str, Any]]:
+    """
+    读取 genai-repo-watchlist 表中的所有repo，按优先级排序
+
+    Args:
+        table_name: watchlist表名
+        region: DynamoDB所在区域
+        access: 数据访问层，默认连接 region 中的DynamoDB
+
+    Returns:
+        [{"project_url": ..., "priority": ...}, ...]
+    """
+    access = access or DynamoDBAccess(region=region)
+    items = list(access.iter_scan(table_name))
+    items.sort(key=lambda item: (priority_rank(item.get('priority')), item.get('project_url', '')))
+    return items
+
+
+def classify_error(error: Optional[Exception]) -> Optional[str]:
+    """
+    将DifyHelper返回的错误分类
+
+    Returns:
+        None (成功), "overload" (超时/504，后端压力过大), "retryable" (其他网络错误), "fatal" (不应重试)
+    """
+    if error is None:
+        return None
+    if isinstance(error, requests.exceptions.Timeout):
+        return "overload"
+    if isinstance(error, requests.exceptions.HTTPError):
+        if error.response is not None and error.response.status_code == 504:
+            return "overload"
+        return "fatal"
+    if isinstance(error, (requests.exceptions.RequestException, json.JSONDecodeError, KeyError)):
+        return "retryable"
+    return "fatal"
+
+
+class AdaptiveRateLimiter:
+    """
+    AIMD式的并发限制：成功时线性增加允许的并发数，遇到超时/504时按比例减少，
+    并在继续派发新任务之前冷却一段时间（连续过载时冷却时间指数增长）。
+    """
+
+    def __init__(self, initial_limit: int = 2, min_limit: int = 1, max_limit: int = 16, increase_step: float = 0.5, decrease_factor: float = 0.5, base_cooldown: float = 10, max_cooldown: float = 600):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+
+        self._in_flight = 0
+        self._consecutive_overloads = 0
+        self._resume_at = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        等待一个并发槽位；stop_event被设置时返回False
+        """
+        with self._cond:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                wait = self._resume_at - time.monotonic()
+                if wait <= 0 and self._in_flight < self.current_limit:
+                    self._in_flight += 1
+                    return True
+                self._cond.wait(timeout=min(wait, 1.0) if wait > 0 else 1.0)
+
+    def release(self, outcome: Optional[str]) -> float:
+        """
+        归还槽位，并根据调用结果调整并发数
+
+        Args:
+            outcome: classify_error 的返回值
+
+        Returns:
+            冷却结束时间因本次调用推迟的秒数（与进行中的冷却重叠的部分不计），未冷却时为0
+        """
+        extended = 0.0
+        with self._cond:
+            self._in_flight -= 1
+            if outcome == "overload":
+                self._consecutive_overloads += 1
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** (self._consecutive_overloads - 1)))
+                now = time.monotonic()
+                extended = max(0.0, now + cooldown - max(self._resume_at, now))
+                self._resume_at = max(self._resume_at, now + cooldown)
+                logger.warning(f"后端过载，并发数降为 {self.current_limit}，冷却 {cooldown:.0f} 秒")
+            elif outcome is None:
+                self._consecutive_overloads = 0
+                self.limit = min(self.max_limit, self.limit + self.increase_step)
+            self._cond.notify_all()
+        return extended
+
+    def cancel(self):
+        """
+        归还没有使用的槽位，不调整并发数
+        """
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+
+@dataclass(order=True)
+class ScheduledJob:
+    rank: int
+    seq: int
+    repo: str = field(compare=False)
+    start_date: str = field(compare=False)
+    attempt: int = field(default=0, compare=False)
+
+
+@dataclass
+class JobResult:
+    repo: str
+    start_date: str
+    output: Union[Dict, str]
+    error: Optional[Exception]
+    attempts: int
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class JobScheduler:
+    """
+    按优先级调度 github_repo_analyze 工作流，使用工作线程池和自适应限流
+
+    每次调用只做一次尝试 (DifyHelper max_retries=0)，失败后的重试由调度器统一
+    安排，这样退避等待不会占用工作线程，也能让限流器看到每一次超时/504。
+    调用经由 client_registry，与本进程和（提供 cache 时）其他进程中的相同调用合并。
+    """
+
+    def __init__(self, workflow_api_key: str, workflow_api_url: str = WORKFLOW_URL, max_workers: int = 16, max_attempts: int = 6, timeout: int = 900, retry_delay: float = 10, max_retry_delay: float = 600, rate_limiter: Optional[AdaptiveRateLimiter] = None, on_result: Optional[Callable[[JobResult], None]] = None, instrumentation: Optional[Instrumentation] = None, cache: Optional[WorkflowResultCache] = None):
+        """
+        Args:
+            workflow_api_key: github_repo_analyze 工作流的API密钥
+            workflow_api_url: 工作流API地址
+            max_workers: 工作线程数，即并发上限 (default: 16)
+            max_attempts: 每个任务的最大尝试次数 (default: 6, 与DifyHelper的max_retries=5一致)
+            timeout: 单次请求超时时间 (default: 900秒)
+            retry_delay: 非过载类错误的初始重试间隔 (default: 10秒)
+            max_retry_delay: 最大重试间隔 (default: 600秒)
+            rate_limiter: 自适应限流器，默认在 [1, max_workers] 之间调节
+            on_result: 每个任务结束时的回调
+            instrumentation: 指标采集（可选），每次尝试记录为一次调用；重新排队的等待、
+                限流器冷却、等待槽位的时间和每个任务的尝试次数另外记录
+            cache: 结果缓存（可选），每次尝试的结果都会写入；其他进程正在运行相同输入时等待其结果
+        """
+        self.workflow_api_key = workflow_api_key
+        self.workflow_api_url = workflow_api_url
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(max_limit=max_workers)
+        self.on_result = on_result
+        self.instrumentation = instrumentation
+        self.cache = cache
+
+        self._queue: List[ScheduledJob] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._done = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self.results: List[JobResult] = []
+        self._started_at: Dict[Tuple[str, str], float] = {}
+
+    def submit(self, repo: str, start_date: str, priority: Optional[str] = None):
+        with self._lock:
+            heapq.heappush(self._queue, ScheduledJob(priority_rank(priority), next(self._seq), repo, start_date))
+            self._started_at.setdefault((repo, start_date), time.monotonic())
+            self._pending += 1
+            self._done.notify_all()
+
+    def _invoke(self, job: ScheduledJob) -> Tuple[Union[Dict, str], Optional[Exception]]:
+        # client_registry 为每个工作线程保留自己的DifyHelper (requests.Session 不保证线程安全)
+        return client_registry.invoke_result(
+            {"repo": job.repo, "start_date": job.start_date}, self.workflow_api_key, self.workflow_api_url,
+            instrumentation=self.instrumentation, cache=self.cache, workflow=WORKFLOW_NAME,
+            max_retries=0, timeout=self.timeout
+        )
+
+    def _next_job(self) -> Optional[ScheduledJob]:
+        with self._lock:
+            while not self._queue:
+                if self._stop.is_set() or self._pending == 0:
+                    return None
+                self._done.wait(timeout=1.0)
+            return heapq.heappop(self._queue)
+
+    def _worker(self):
+        try:
+            while True:
+                # 先取得并发槽位再出队，避免等待槽位的工作线程各自占着已出队的低优先级任务
+                waiting_since = time.monotonic()
+                if not self.rate_limiter.acquire(self._stop):
+                    return
+                slot_wait = time.monotonic() - waiting_since
+                job = self._next_job()
+                if job is None:
+                    self.rate_limiter.cancel()
+                    return
+                if self.instrumentation is not None:
+                    self.instrumentation.record_slot_wait(slot_wait)
+
+                logger.info(f"开始分析项目: {job.repo}, 日期: {job.start_date} (第 {job.attempt + 1} 次)")
+                outcome = "fatal"
+                try:
+                    output, error = self._invoke(job)
+                    outcome = classify_error(error)
+                except Exception as e:
+                    output, error = "", e
+                finally:
+                    cooldown = self.rate_limiter.release(outcome)
+                if cooldown > 0 and self.instrumentation is not None:
+                    self.instrumentation.record_cooldown(cooldown)
+
+                job.attempt += 1
+                if outcome in ("overload", "retryable") and job.attempt < self.max_attempts:
+                    # 过载由限流器统一冷却；其他网络错误按任务单独退避，不占用工作线程
+                    delay = 0 if outcome == "overload" else min(self.max_retry_delay, self.retry_delay * (2 ** (job.attempt - 1)))
+                    logger.warning(f"项目分析失败，{delay:.0f} 秒后重试: {job.repo}, 错误: {error}")
+                    if self.instrumentation is not None:
+                        self.instrumentation.record_requeue(outcome, delay)
+                    self._requeue(job, delay)
+                    continue
+
+                self._finish(job, output, error)
+        finally:
+            client_registry.release_thread()
+
+    def _requeue(self, job: ScheduledJob, delay: float):
+        def push():
+            with self._lock:
+                heapq.heappush(self._queue, job)
+                self._done.notify_all()
+
+        if delay <= 0:
+            push()
+            return
+        timer = threading.Timer(delay, push)
+        timer.daemon = True
+        timer.start()
+
+    def _finish(self, job: ScheduledJob, output: Union[Dict, str], error: Optional[Exception]):
+        with self._lock:
+            started = self._started_at.pop((job.repo, job.start_date), time.monotonic())
+            result = JobResult(job.repo, job.start_date, output, error, job.attempt, time.monotonic() - started)
+            self.results.append(result)
+            self._pending -= 1
+            self._done.notify_all()
+
+        if self.instrumentation is not None:
+            self.instrumentation.record_job(result.attempts, error)
+        if result.ok:
+            logger.info(f"项目分析完成: {job.repo} ({result.elapsed:.1f}s, {result.attempts} 次尝试)")
+        else:
+            logger.error(f"项目分析失败: {job.repo}, 错误: {error}")
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def run(self) -> List[JobResult]:
+        """
+        运行所有已提交的任务，直到全部完成或失败
+        """
+        workers = [threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True) for i in range(self.max_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(timeout=1.0)
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        return self.results
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._done.notify_all()
+
+
+def run_watchlist(workflow_api_key: str, start_date: str, table_name: str = WATCHLIST_TABLE, region: str = 'us-east-1', cache: Optional[WorkflowResultCache] = None, activity_client: Optional[GitHubActivityClient] = None, **scheduler_kwargs) -> List[JobResult]:
+    """
+    读取watchlist并按优先级分析所有repo
+
+    Args:
+        workflow_api_key: github_repo_analyze 工作流的API密钥
+        start_date: 分析日期 (YYYY-MM-DD)
+        table_name: watchlist表名
+        region: DynamoDB所在区域
+        cache: 结果缓存；已成功完成的 (repo, start_date) 会被跳过，新结果会写入缓存，
+            与同时运行的其他进程（例如手动回填）去重
+        activity_client: 若提供，先向GitHub查询活跃度，跳过自 start_date 起没有commit/PR的repo
+            （不看issue和star；跳过当天的增量由 daily_deltas 计入下一次快照）
+        scheduler_kwargs: 透传给 JobScheduler
+    """
+    repos = load_watchlist(table_name, region)
+    logger.info(f"从 {table_name} 读取到 {len(repos)} 个repo")
+
+    if cache is not None:
+        remaining = {inputs["repo"] for inputs in cache.pending(WORKFLOW_NAME, [{"repo": item['project_url'], "start_date": start_date} for item in repos])}
+        pending = [item for item in repos if item['project_url'] in remaining]
+        if len(pending) < len(repos):
+            logger.info(f"跳过 {len(repos) - len(pending)} 个已完成的repo")
+            repos = pending
+
+    if activity_client is not None:
+        _, quiet = activity_client.filter_active([item['project_url'] for item in repos], start_date)
+        if quiet:
+            logger.info(f"跳过 {len(quiet)} 个没有新活动的repo")
+            quiet = set(quiet)
+            repos = [item for item in repos if item['project_url'] not in quiet]
+
+    scheduler = JobScheduler(workflow_api_key, cache=cache, **scheduler_kwargs)
+    for item in repos:
+        scheduler.submit(item['project_url'], start_date, item.get('priority'))
+    results = scheduler.run()
+
+    failed = [r for r in results if not r.ok]
+    logger.info(f"每日采集结束: 成功 {len(results) - len(failed)}, 失败 {len(failed)}")
+    return results
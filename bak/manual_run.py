@@ -3,8 +3,14 @@ import requests
 import json
 import os
 import argparse
+import asyncio
 from datetime import datetime, timedelta
 from dify_helper import invoke_slow_workflow
+from async_dify_helper import invoke_workflows
+from instrumentation import instrumentation_from_env
+from result_cache import WorkflowResultCache
+from trend_index import TrendCandidateIndex, run_trend_candidates
+from github_activity import GitHubActivityClient
 from typing import Dict, Any
 from dotenv import load_dotenv
 
@@ -27,12 +33,18 @@ def run_project_analyze_job(repo: str, start_date: str):
 
     return invoke_slow_workflow(record = {"repo": repo, "start_date": start_date}, workflow_api_key=workflow_api_key_github_analyze)
 
-def run_github_get_trend_job(repo: str, start_date: str):
+def run_github_get_trend_job(collect_date: str = None):
     """
-    run github_repo_analyze workflow
+    run github_trend_analyze workflow, skipping candidates analyzed recently without material star growth
     """
-
-    return invoke_slow_workflow(record = {}, workflow_api_key=workflow_api_key_github_trend)
+    collect_date = collect_date or datetime.now().strftime("%Y-%m-%d")
+    activity_client = GitHubActivityClient() if os.getenv('ACTIVITY_PREFILTER', '1') != '0' else None
+    try:
+        with TrendCandidateIndex() as index:
+            return run_trend_candidates(workflow_api_key_github_trend, collect_date, index, activity_client=activity_client)
+    finally:
+        if activity_client is not None:
+            activity_client.close()
 
 
 def run_hellogithub_routine_job():
@@ -43,15 +55,79 @@ def run_hellogithub_routine_job():
     
     return invoke_slow_workflow(record=input_dict, workflow_api_key=workflow_api_key_hellogithub)
 
+def expand_backfill_matrix(repos, start_date: str, end_date: str):
+    """
+    展开 repo × 日期 矩阵
+
+    同一个repo的所有日期排在一起并按日期递增，这样并发执行时同一repo的请求集中在
+    一段时间内完成，上游对该repo的GitHub数据抓取更容易命中缓存。
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    if end < start:
+        raise ValueError(f"结束日期 {end_date} 早于开始日期 {start_date}")
+    dates = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+    return [{"repo": repo, "start_date": date} for repo in repos for date in dates]
+
+async def run_project_analyze_jobs(records, concurrency: int, cache: WorkflowResultCache = None):
+    """
+    run github_repo_analyze workflow for all (repo, start_date) records concurrently, skipping runs already completed in cache
+    """
+    if cache is not None:
+        pending = cache.pending("github_repo_analyze", records)
+        if len(pending) < len(records):
+            print(f"跳过 {len(records) - len(pending)} 个已完成的任务")
+        records = pending
+
+    total = len(records)
+    done = 0
+    failed = 0
+    started = time.monotonic()
+    # 结果由invoke_workflows写入缓存，同时运行的每日采集中的相同 (repo, start_date) 只会运行一次
+    async for result in invoke_workflows(records, workflow_api_key_github_analyze, concurrency=concurrency, instrumentation=instrumentation_from_env("github_repo_analyze"), cache=cache, workflow="github_repo_analyze"):
+        repo = result.record["repo"]
+        start_date = result.record["start_date"]
+        done += 1
+        if result.ok:
+            print(f"✓ 完成: {repo} {start_date} ({result.elapsed:.1f}s)")
+        else:
+            failed += 1
+            print(f"✗ 失败: {repo} {start_date} - {result.error}")
+
+        elapsed = time.monotonic() - started
+        eta = elapsed / done * (total - done)
+        print(f"进度: {done}/{total}, 失败 {failed}, 已用 {elapsed:.0f}s, 预计剩余 {eta:.0f}s")
+
+    return failed
+
 def main():
     parser = argparse.ArgumentParser(description='手动运行GenAI项目分析')
     parser.add_argument('--date', '-d', type=str, default='2025-10-22', 
                        help='分析开始日期 (格式: YYYY-MM-DD, 默认: 2025-10-22)')
+    parser.add_argument('--start', type=str, default=None,
+                       help='回填模式的开始日期 (格式: YYYY-MM-DD)，与--end一起使用时忽略--date')
+    parser.add_argument('--end', type=str, default=None,
+                       help='回填模式的结束日期，包含当天 (格式: YYYY-MM-DD, 默认: 昨天)')
+    parser.add_argument('--repo', '-r', action='append', default=None,
+                       help='要分析的项目URL，可重复指定 (默认: 内置项目列表)')
+    
+    parser.add_argument('--concurrency', '-c', type=int, default=4,
+                       help='同时运行的工作流数量 (默认: 4)')
+    parser.add_argument('--cache', type=str, default=None,
+                       help='结果缓存文件，重新运行时跳过已完成的项目 (默认: $WORKFLOW_CACHE_PATH 或 workflow_cache.sqlite3)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='不读写结果缓存，重新运行所有项目')
+    parser.add_argument('--trend', action='store_true',
+                       help='运行github_trend_analyze工作流（跳过最近已分析的候选），而不是项目分析')
     
     args = parser.parse_args()
     
+    if args.trend:
+        run_github_get_trend_job()
+        return
+    
     # 项目列表
-    repos = [
+    repos = args.repo or [
         "https://github.com/vllm-project/vllm",
         "https://github.com/sgl-project/sglang", 
         "https://github.com/langgenius/dify",
@@ -60,15 +136,23 @@ def main():
         "https://github.com/hiyouga/LLaMA-Factory"
     ]
     
-    print(f"开始分析项目，起始日期: {args.date}")
-    
-    for repo in repos:
-        print(f"分析项目: {repo}")
-        try:
-            result = run_project_analyze_job(repo, args.date)
-            print(f"✓ 完成: {repo}")
-        except Exception as e:
-            print(f"✗ 失败: {repo} - {e}")
+    if args.start:
+        end_date = args.end or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        records = expand_backfill_matrix(repos, args.start, end_date)
+        print(f"回填模式: {len(repos)} 个项目 × {args.start} ~ {end_date}, 共 {len(records)} 个任务, 并发数: {args.concurrency}")
+    else:
+        records = [{"repo": repo, "start_date": args.date} for repo in repos]
+        print(f"开始分析项目，起始日期: {args.date}, 并发数: {args.concurrency}")
+
+    cache = None if args.no_cache else WorkflowResultCache(args.cache)
+    try:
+        failed = asyncio.run(run_project_analyze_jobs(records, args.concurrency, cache))
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if failed:
+        print(f"{failed} 个任务失败，重新运行同一命令即可只重试失败的任务")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+
+from json_repair import repair_json
+
+from dynamodb_access import DynamoDBAccess, RAW_DATA_TABLE
+from job_scheduler import load_watchlist
+from chart_renderer import activity_chart_specs, render_charts
+from snapshot_store import SnapshotStore
+from trend_metrics import compute_trend_metrics
+
+logger = logging.getLogger(__name__)
+
+REPORT_OUTPUT_DIR = 'report_output'
+
+# README §1.1 / §3.3 的条数限制
+MAX_FEATURES = 5
+MAX_FEATURES_PER_REPO = 3
+TREND_DAYS = 15
+
+# 原始记录中可能保存PR列表的字段
+PR_LIST_FIELDS = ('pr_list', 'prs', 'pull_requests', 'changes', 'updates')
+
+# README §1.2: 只关注GenAI相关的云服务，按服务名匹配而不是厂商名（"Use AWS S3 for storage" 不算）
+CLOUD_PATTERNS = {
+    'AWS': re.compile(r'\b(bedrock|sagemaker)\b', re.IGNORECASE),
+    'Azure': re.compile(r'\b(azure[\s_-]*(open[\s_-]*ai|ai|ml)|(azure[\s_-]*)?ai[\s_-]*foundry)\b', re.IGNORECASE),
+    'Google Cloud': re.compile(r'\bvertex([\s_-]*ai)?\b', re.IGNORECASE),
+    'Ali Cloud': re.compile(r'\b(dashscope|bailian|pai[\s_-]*(eas|dsw|dlc)|(aliyun|alibaba[\s_-]*cloud)[\s_-]*pai)\b', re.IGNORECASE),
+}
+EXCLUDED_CLOUD_TYPES = {'refactor', 'doc', 'docs', 'chore', 'test'}
+
+
+def _field(record: Dict[str, Any], *names: str, default: Any = None) -> Any:
+    for name in names:
+        if record.get(name) not in (None, ''):
+            return record[name]
+    return default
+
+
+def extract_prs(item: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    从一条 github-insight-raw-data 记录中取出PR列表，兼容以JSON字符串保存的情况
+    """
+    for name in PR_LIST_FIELDS:
+        value = item.get(name)
+        if value in (None, ''):
+            continue
+        if isinstance(value, str):
+            value = repair_json(value, return_objects=True)
+        if isinstance(value, dict):
+            value = [value]
+        if isinstance(value, list):
+            return [pr for pr in value if isinstance(pr, dict)]
+    return []
+
+
+def _pr_entry(repo: str, pr: Dict[str, Any]) -> Dict[str, Any]:
+    number = _field(pr, 'pr_number', 'number', 'id')
+    return {
+        "repo": repo,
+        "number": number,
+        "title": _field(pr, 'title', 'pr_title', default=''),
+        "url": _field(pr, 'url', 'pr_url', 'link', 'html_url', default=f"{repo}/pull/{number}" if number is not None else repo),
+        "type": _field(pr, 'type', default=''),
+        "importance": _field(pr, 'importance', default=''),
+        "summary": _field(pr, 'summary', 'description', 'desc', default=''),
+    }
+
+
+def _pr_number(entry: Dict[str, Any]) -> int:
+    try:
+        return int(str(entry['number']).lstrip('#'))
+    except (TypeError, ValueError):
+        return 0
+
+
+def select_features(entries: List[Dict[str, Any]], repo_order: List[str], max_total: int = MAX_FEATURES, max_per_repo: int = MAX_FEATURES_PER_REPO) -> List[Dict[str, Any]]:
+    """
+    README §2.2: 只保留 type="Feat" AND importance="High"，并执行总数/单repo上限
+
+    各repo内按PR编号从新到旧，repo之间按watchlist顺序轮流选取，避免名额被一个repo占满。
+    """
+    by_repo: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        if str(entry['type']).lower() == 'feat' and str(entry['importance']).lower() == 'high':
+            by_repo.setdefault(entry['repo'], []).append(entry)
+    for candidates in by_repo.values():
+        candidates.sort(key=_pr_number, reverse=True)
+
+    order = [repo for repo in repo_order if repo in by_repo] + sorted(set(by_repo) - set(repo_order))
+    selected = []
+    for rank in range(max_per_repo):
+        for repo in order:
+            if len(selected) >= max_total:
+                return selected
+            if rank < len(by_repo[repo]):
+                selected.append(by_repo[repo][rank])
+    return selected
+
+
+def select_cloud_integrations(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    README §1.2: 匹配GenAI云服务关键字，排除重构/文档类更新；条数不限
+    """
+    selected = []
+    for entry in entries:
+        if str(entry['type']).lower() in EXCLUDED_CLOUD_TYPES:
+            continue
+        text = f"{entry['title']} {entry['summary']}"
+        providers = [provider for provider, pattern in CLOUD_PATTERNS.items() if pattern.search(text)]
+        if providers:
+            selected.append({**entry, "providers": providers})
+    selected.sort(key=lambda entry: (entry['providers'][0], entry['repo'], -_pr_number(entry)))
+    return selected
+
+
+def build_report_context(report_date: str, access: Optional[DynamoDBAccess] = None, snapshot_store: Optional[SnapshotStore] = None, output_dir: str = REPORT_OUTPUT_DIR, region: str = 'us-east-1', render: bool = True) -> Dict[str, Any]:
+    """
+    生成报告所需的紧凑上下文，LLM只需要据此撰写文字
+
+    Args:
+        report_date: 报告日期 (YYYY-MM-DD)
+        access: 数据访问层
+        snapshot_store: 本地快照镜像，用于趋势统计
+        output_dir: 报告输出目录
+        region: DynamoDB所在区域
+        render: 是否渲染趋势图（数据未变化的图表会被跳过）
+
+    Returns:
+        可直接序列化为JSON的dict
+    """
+    access = access or DynamoDBAccess(region=region)
+    snapshot_store = snapshot_store or SnapshotStore()
+
+    # README 数据范围: priority='Human-P0'
+    watchlist = [item for item in load_watchlist(access=access) if item.get('priority') == 'Human-P0']
+    repos = [item['project_url'] for item in watchlist]
+
+    # 最新数据: 当日，缺失时取前1日
+    previous_date = (datetime.strptime(report_date, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+    keys = [{"project_url": repo, "collect_date": date} for repo in repos for date in (report_date, previous_date)]
+    raw_items = {}
+    for item in access.batch_get(RAW_DATA_TABLE, keys):
+        current = raw_items.get(item['project_url'])
+        if current is None or item['collect_date'] > current['collect_date']:
+            raw_items[item['project_url']] = item
+
+    entries = [_pr_entry(repo, pr) for repo in repos if repo in raw_items for pr in extract_prs(raw_items[repo])]
+
+    snapshot_store.sync(repos, access=access)
+    # 15个日增量需要16天的累计值
+    _, dates, snapshots = snapshot_store.load_window(report_date, TREND_DAYS + 1, repos)
+    domains = {item['project_url']: item['domain'] for item in watchlist if item.get('domain')}
+    metrics = compute_trend_metrics(repos, dates, snapshots, domains=domains)
+
+    specs = activity_chart_specs(metrics, os.path.join(output_dir, 'images'), domains)
+    if render:
+        render_charts(specs)
+
+    context = {
+        "report_date": report_date,
+        "repos": repos,
+        "data_dates": {repo: raw_items[repo]['collect_date'] for repo in repos if repo in raw_items},
+        "features": select_features(entries, repos),
+        "cloud_integrations": select_cloud_integrations(entries),
+        "trends": {
+            "window": [metrics.dates[0], metrics.dates[-1]] if metrics.dates else [],
+            "repos": metrics.repo_summary(),
+        },
+        "charts": {
+            "activity_trends": specs[0]["path"],
+            "domains": {spec["title"]: spec["path"] for spec in specs[1:]},
+        },
+    }
+    if metrics.domains:
+        context["trends"]["domains"] = [
+            {"domain": domain, **{name: float(totals[i]) for name, totals in metrics.domain_totals.items()}}
+            for i, domain in enumerate(metrics.domains)
+        ]
+    return context
+
+
+def _json_default(value: Any) -> Any:
+    # DynamoDB返回的数值是Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成GenAI Insight Report的预计算上下文')
+    parser.add_argument('--date', '-d', type=str, default=None,
+                       help='报告日期 (格式: YYYY-MM-DD, 默认: 昨天)')
+    parser.add_argument('--output-dir', type=str, default=REPORT_OUTPUT_DIR,
+                       help=f'报告输出目录 (默认: {REPORT_OUTPUT_DIR})')
+    parser.add_argument('--region', type=str, default='us-east-1',
+                       help='DynamoDB所在区域 (默认: us-east-1)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    report_date = args.date or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    context = build_report_context(report_date, output_dir=args.output_dir, region=args.region)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"context_{report_date}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(context, f, ensure_ascii=False, indent=2, default=_json_default)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Any, Awaitable, Callable, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = 'workflow_cache.sqlite3'
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+
+# 跨进程running标记的租约时长（秒）；持有者每 1/3 租约续期一次，进程退出后最多这么久其他进程即可接手
+DEFAULT_LEASE_SECONDS = 60
+# 等待其他进程的运行结果时的轮询间隔（秒）
+DEFAULT_POLL_INTERVAL = 5
+# 单条 IN (...) 语句中的键数量上限（旧版SQLite默认最多999个参数）
+SQL_BATCH_SIZE = 500
+
+RunResult = Tuple[Union[Dict, str], Optional[Exception]]
+
+
+def normalize_inputs(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    规范化工作流输入，使同一个 (repo, start_date) 的不同写法得到相同的缓存键
+
+    - repo/project_url: 去掉首尾空白、末尾的 "/" 和 ".git"，并转为小写
+    - 其他字符串: 去掉首尾空白
+    """
+    normalized = {}
+    for key, value in inputs.items():
+        if isinstance(value, str):
+            value = value.strip()
+            if key in ('repo', 'project_url'):
+                value = value.rstrip('/')
+                if value.endswith('.git'):
+                    value = value[:-4]
+                value = value.lower()
+        normalized[key] = value
+    return normalized
+
+
+def cache_key(workflow: str, inputs: Dict[str, Any]) -> str:
+    payload = json.dumps({"workflow": workflow, "inputs": normalize_inputs(inputs)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    workflow: str
+    inputs: Dict[str, Any]
+    status: str
+    output: Union[Dict, str, None]
+    error: Optional[str]
+    attempts: int
+    updated_at: float
+
+    @property
+    def ok(self) -> bool:
+        return self.status == STATUS_OK
+
+
+class WorkflowResultCache:
+    """
+    工作流调用结果的本地持久化缓存（SQLite）
+
+    以 工作流名称 + 规范化后的输入 作为键，成功和失败分别记录，因此重新运行时
+    可以跳过已完成的 (repo, date)，只重试失败或尚未运行的部分。
+
+    同一个文件也用于跨进程去重（例如每日采集和手动回填同时运行）：run_exclusive 运行期间在
+    workflow_runs 表中保留一条带租约的running标记，其他进程的相同调用轮询等待其结果。
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, max_entries: Optional[int] = 100000, lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        """
+        Args:
+            path: SQLite文件路径，默认取环境变量 WORKFLOW_CACHE_PATH，未设置时为 workflow_cache.sqlite3
+            ttl: 成功结果的有效期（秒），None表示永不过期
+            max_entries: 最多保留的记录数，超出时淘汰最久未访问的记录
+            lease_seconds: running标记的租约时长（秒）
+            poll_interval: 等待其他进程的运行结果时的轮询间隔（秒）
+        """
+        self.path = path or os.getenv('WORKFLOW_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS workflow_results (
+                key TEXT PRIMARY KEY,
+                workflow TEXT NOT NULL,
+                inputs TEXT NOT NULL,
+                status TEXT NOT NULL,
+                output TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_workflow_results_accessed ON workflow_results (accessed_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS workflow_runs (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, workflow: str, inputs: Dict[str, Any]) -> Optional[CacheEntry]:
+        """
+        读取缓存记录；过期的成功记录视为不存在
+        """
+        key = cache_key(workflow, inputs)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT workflow, inputs, status, output, error, attempts, updated_at FROM workflow_results WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[2], row[6]):
+                return None
+            self._conn.execute("UPDATE workflow_results SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        output = json.loads(row[3]) if row[3] is not None else None
+        return CacheEntry(row[0], json.loads(row[1]), row[2], output, row[4], row[5], row[6])
+
+    def is_completed(self, workflow: str, inputs: Dict[str, Any]) -> bool:
+        """
+        是否已有未过期的成功记录；只读，不更新访问时间（批量检查请用 pending）
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, updated_at FROM workflow_results WHERE key = ?",
+                (cache_key(workflow, inputs),)
+            ).fetchone()
+        return row is not None and row[0] == STATUS_OK and not self._expired(row[0], row[1])
+
+    def pending(self, workflow: str, inputs_list: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        过滤出尚未成功完成的输入（失败的、过期的和从未运行的）
+
+        已完成记录的访问时间在一次事务中批量更新，而不是每条输入提交一次。
+        """
+        inputs_list = list(inputs_list)
+        keys = [cache_key(workflow, inputs) for inputs in inputs_list]
+        unique_keys = list(dict.fromkeys(keys))
+        completed = set()
+        with self._lock:
+            for i in range(0, len(unique_keys), SQL_BATCH_SIZE):
+                batch = unique_keys[i:i + SQL_BATCH_SIZE]
+                rows = self._conn.execute(
+                    f"SELECT key, updated_at FROM workflow_results WHERE status = ? AND key IN ({','.join('?' * len(batch))})",
+                    (STATUS_OK, *batch)
+                ).fetchall()
+                completed.update(key for key, updated_at in rows if not self._expired(STATUS_OK, updated_at))
+            if completed:
+                now = time.time()
+                touched = list(completed)
+                for i in range(0, len(touched), SQL_BATCH_SIZE):
+                    batch = touched[i:i + SQL_BATCH_SIZE]
+                    self._conn.execute(
+                        f"UPDATE workflow_results SET accessed_at = ? WHERE key IN ({','.join('?' * len(batch))})",
+                        (now, *batch)
+                    )
+                self._conn.commit()
+        return [inputs for inputs, key in zip(inputs_list, keys) if key not in completed]
+
+    def put_success(self, workflow: str, inputs: Dict[str, Any], output: Union[Dict, str]):
+        self._put(workflow, inputs, STATUS_OK, json.dumps(output, ensure_ascii=False), None)
+
+    def put_failure(self, workflow: str, inputs: Dict[str, Any], error: Union[Exception, str]):
+        self._put(workflow, inputs, STATUS_FAILED, None, str(error))
+
+    def record(self, workflow: str, inputs: Dict[str, Any], output: Union[Dict, str], error: Optional[Exception]):
+        """
+        根据 invoke_workflow_result 的返回值记录成功或失败
+        """
+        if error is None:
+            self.put_success(workflow, inputs, output)
+        else:
+            self.put_failure(workflow, inputs, error)
+
+    def _put(self, workflow: str, inputs: Dict[str, Any], status: str, output: Optional[str], error: Optional[str]):
+        now = time.time()
+        key = cache_key(workflow, inputs)
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO workflow_results (key, workflow, inputs, status, output, error, attempts, updated_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    status = excluded.status,
+                    output = excluded.output,
+                    error = excluded.error,
+                    attempts = workflow_results.attempts + 1,
+                    updated_at = excluded.updated_at,
+                    accessed_at = excluded.accessed_at
+            """, (key, workflow, json.dumps(normalize_inputs(inputs), sort_keys=True, ensure_ascii=False), status, output, error, now, now))
+            self._conn.commit()
+        self.evict()
+
+    def _expired(self, status: str, updated_at: float) -> bool:
+        return status == STATUS_OK and self.ttl is not None and updated_at < time.time() - self.ttl
+
+    def evict(self) -> int:
+        """
+        删除过期记录，并在超过 max_entries 时按最近访问时间淘汰
+
+        Returns:
+            删除的记录数
+        """
+        removed = 0
+        with self._lock:
+            if self.ttl is not None:
+                cursor = self._conn.execute(
+                    "DELETE FROM workflow_results WHERE status = ? AND updated_at < ?",
+                    (STATUS_OK, time.time() - self.ttl)
+                )
+                removed += cursor.rowcount
+            if self.max_entries is not None:
+                cursor = self._conn.execute("""
+                    DELETE FROM workflow_results WHERE key IN (
+                        SELECT key FROM workflow_results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                removed += cursor.rowcount
+            self._conn.commit()
+        return removed
+
+    def completed_since(self, workflow: str, inputs: Dict[str, Any], since: float) -> Optional[CacheEntry]:
+        """
+        在 since (time.time()) 之后成功完成的记录
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT workflow, inputs, status, output, error, attempts, updated_at FROM workflow_results WHERE key = ? AND status = ? AND updated_at >= ?",
+                (cache_key(workflow, inputs), STATUS_OK, since)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(row[0], json.loads(row[1]), row[2], json.loads(row[3]), row[4], row[5], row[6])
+
+    def acquire_run(self, workflow: str, inputs: Dict[str, Any], owner: str) -> bool:
+        """
+        写入running标记；其他owner持有未过期的租约时返回False
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute("""
+                INSERT INTO workflow_runs (key, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE workflow_runs.expires_at < ? OR workflow_runs.owner = excluded.owner
+            """, (cache_key(workflow, inputs), owner, now + self.lease_seconds, now))
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def renew_run(self, workflow: str, inputs: Dict[str, Any], owner: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE workflow_runs SET expires_at = ? WHERE key = ? AND owner = ?",
+                (time.time() + self.lease_seconds, cache_key(workflow, inputs), owner)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def release_run(self, workflow: str, inputs: Dict[str, Any], owner: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM workflow_runs WHERE key = ? AND owner = ?", (cache_key(workflow, inputs), owner))
+            self._conn.commit()
+
+    def run_exclusive(self, workflow: str, inputs: Dict[str, Any], run: Callable[[], RunResult]) -> RunResult:
+        """
+        持有running标记运行 run() 并记录结果；其他进程正在运行相同输入时，轮询等待其结果
+
+        对方成功时直接返回其输出；对方失败或租约过期（进程已退出）时由本进程接手重新运行。
+
+        Args:
+            workflow: 工作流名称
+            inputs: 工作流输入
+            run: 实际的调用，返回 (output, error)
+
+        Returns:
+            (output, error)
+        """
+        owner, since = uuid.uuid4().hex, time.time()
+        waiting = False
+        while not self.acquire_run(workflow, inputs, owner):
+            if not waiting:
+                logger.info(f"其他进程正在运行相同输入的 {workflow}，等待其结果: {normalize_inputs(inputs)}")
+                waiting = True
+            time.sleep(self.poll_interval)
+            entry = self.completed_since(workflow, inputs, since)
+            if entry is not None:
+                return entry.output, None
+
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.lease_seconds / 3):
+                self.renew_run(workflow, inputs, owner)
+
+        thread = threading.Thread(target=heartbeat, name='workflow-run-lease', daemon=True)
+        thread.start()
+        try:
+            # 等待期间对方可能刚好完成并释放了标记
+            entry = self.completed_since(workflow, inputs, since)
+            if entry is not None:
+                return entry.output, None
+            output, error = run()
+            self.record(workflow, inputs, output, error)
+            return output, error
+        finally:
+            stop.set()
+            thread.join()
+            self.release_run(workflow, inputs, owner)
+
+    async def arun_exclusive(self, workflow: str, inputs: Dict[str, Any], run: Callable[[], Awaitable[RunResult]]) -> RunResult:
+        """
+        run_exclusive 的asyncio版本
+        """
+        owner, since = uuid.uuid4().hex, time.time()
+        waiting = False
+        while not self.acquire_run(workflow, inputs, owner):
+            if not waiting:
+                logger.info(f"其他进程正在运行相同输入的 {workflow}，等待其结果: {normalize_inputs(inputs)}")
+                waiting = True
+            await asyncio.sleep(self.poll_interval)
+            entry = self.completed_since(workflow, inputs, since)
+            if entry is not None:
+                return entry.output, None
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                self.renew_run(workflow, inputs, owner)
+
+        task = asyncio.ensure_future(heartbeat())
+        try:
+            entry = self.completed_since(workflow, inputs, since)
+            if entry is not None:
+                return entry.output, None
+            output, error = await run()
+            self.record(workflow, inputs, output, error)
+            return output, error
+        finally:
+            task.cancel()
+            self.release_run(workflow, inputs, owner)
+
+    def failures(self, workflow: str) -> List[CacheEntry]:
+        """
+        列出某个工作流所有失败的记录
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT workflow, inputs, status, output, error, attempts, updated_at FROM workflow_results WHERE workflow = ? AND status = ? ORDER BY updated_at",
+                (workflow, STATUS_FAILED)
+            ).fetchall()
+        return [CacheEntry(row[0], json.loads(row[1]), row[2], None, row[4], row[5], row[6]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -6,6 +6,10 @@ import logging
 import os
 from datetime import datetime, timedelta
 from dify_helper import invoke_slow_workflow
+from job_scheduler import run_watchlist
+from result_cache import WorkflowResultCache
+from github_activity import GitHubActivityClient
+from instrumentation import instrumentation_from_env
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -27,13 +31,26 @@ workflow_api_key_github_analyze = os.getenv('WORKFLOW_API_KEY_GITHUB_ANALYZE')
 if not workflow_api_key_hellogithub or not workflow_api_key_github_analyze:
     raise ValueError("请在.env文件中设置WORKFLOW_API_KEY_HELLOGITHUB和WORKFLOW_API_KEY_GITHUB_ANALYZE")
 
+# 每日采集的最大并发数
+max_workers = int(os.getenv('COLLECTION_MAX_WORKERS', '16'))
+
+# 工作流结果缓存，中途失败后重新运行时只重试失败的repo
+result_cache = WorkflowResultCache()
+
+# 运行工作流前先查询GitHub活跃度，跳过没有新commit/PR的repo（ACTIVITY_PREFILTER=0 关闭）
+activity_client = GitHubActivityClient() if os.getenv('ACTIVITY_PREFILTER', '1') != '0' else None
+
+# 工作流调用指标（INSTRUMENTATION_JSONL_PATH / PROMETHEUS_TEXTFILE_PATH / PROMETHEUS_PORT，都未设置时不采集）
+github_analyze_instrumentation = instrumentation_from_env('github_repo_analyze')
+hellogithub_instrumentation = instrumentation_from_env('hellogithub')
+
 def run_project_analyze_job(repo: str, start_date: str):
     """
     run github_repo_analyze workflow
     """
     logging.info(f"开始分析项目: {repo}, 日期: {start_date}")
     try:
-        result = invoke_slow_workflow(record = {"repo": repo, "start_date": start_date}, workflow_api_key=workflow_api_key_github_analyze)
+        result = invoke_slow_workflow(record = {"repo": repo, "start_date": start_date}, workflow_api_key=workflow_api_key_github_analyze, instrumentation=github_analyze_instrumentation)
         logging.info(f"项目分析完成: {repo}")
         return result
     except Exception as e:
@@ -48,7 +65,7 @@ def run_hellogithub_routine_job():
     input_dict = {"task": "获取https://hellogithub.com/ 中前5个AI相关的项目，把相关项目的信息以json形式输出。\n\n## 参考步骤：\n1. 勾选https://hellogithub.com/的AI 标签\n2. 顺序点击进入每个项目(前5个)\n3. 获取详细信息包括：Stars数量，新增stars in Past 6 days, 项目描述, url 和 tags\n\n## 参考输出格式\n[\n{\n  \"name\": \"..\",\n  \"stars\" : \"..\",\n  \"new_stars_past_7_days\" : \"..\",\n  \"description\": \"...\",\n  \"url\" : \"...\",\n  \"tags\" : [...]\n}\n..\n]"}
     
     try:
-        result = invoke_slow_workflow(record=input_dict, workflow_api_key=workflow_api_key_hellogithub)
+        result = invoke_slow_workflow(record=input_dict, workflow_api_key=workflow_api_key_hellogithub, instrumentation=hellogithub_instrumentation)
         logging.info("HelloGitHub例行任务完成")
         return result
     except Exception as e:
@@ -56,18 +73,21 @@ def run_hellogithub_routine_job():
         raise
 
 
-# 每天12:00执行项目分析
-schedule.every().day.at("10:30").do(lambda: run_project_analyze_job("https://github.com/vllm-project/vllm", (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")))
-
-schedule.every().day.at("10:35").do(lambda: run_project_analyze_job("https://github.com/sgl-project/sglang", (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")))
-
-schedule.every().day.at("10:40").do(lambda: run_project_analyze_job("https://github.com/langgenius/dify", (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")))
-
-schedule.every().day.at("10:45").do(lambda: run_project_analyze_job("https://github.com/cline/cline", (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")))
+def run_daily_collection_job():
+    """
+    run github_repo_analyze workflow for every repo in genai-repo-watchlist
+    """
+    start_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    logging.info(f"开始每日采集, 日期: {start_date}")
+    try:
+        return run_watchlist(workflow_api_key_github_analyze, start_date, cache=result_cache, activity_client=activity_client, max_workers=max_workers, instrumentation=github_analyze_instrumentation)
+    except Exception as e:
+        logging.error(f"每日采集失败: {str(e)}")
+        raise
 
-schedule.every().day.at("10:50").do(lambda: run_project_analyze_job("https://github.com/BerriAI/litellm", (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")))
 
-schedule.every().day.at("10:55").do(lambda: run_project_analyze_job("https://github.com/hiyouga/LLaMA-Factory", (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")))
+# 每天10:30按watchlist优先级采集所有repo，并发数由调度器根据后端状态自适应调整
+schedule.every().day.at("10:30").do(run_daily_collection_job)
 
 # 运行调度器
 logging.info("任务调度器启动")
@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from dynamodb_access import DynamoDBAccess, RAW_DATA_TABLE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PATH = 'snapshots.sqlite3'
+
+# README §2.1 中社区活跃度统计所需的累计值字段
+SNAPSHOT_FIELDS = ('open_pr', 'merged_pr', 'open_issue', 'closed_issue', 'star')
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    try:
+        return float(str(value).replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+class SnapshotStore:
+    """
+    github-insight-raw-data 中数值型快照字段的本地镜像（SQLite）
+
+    按 (project_url, collect_date) 保存 open_pr/merged_pr/open_issue/closed_issue/star，
+    同步时每个repo只查询比本地最新 collect_date 更新的记录，趋势窗口直接从本地读取，
+    不再扫描DynamoDB。
+
+    SQLite是增量同步的落地存储；读取时使用由它生成的稠密矩阵文件
+    (fields × repos × days 的 .npy，按内存映射打开)，数据变化后第一次读取时重建。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: SQLite文件路径，默认取环境变量 SNAPSHOT_STORE_PATH，未设置时为 snapshots.sqlite3
+        """
+        self.path = path or os.getenv('SNAPSHOT_STORE_PATH', DEFAULT_SNAPSHOT_PATH)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        columns = ", ".join(f"{field} REAL" for field in SNAPSHOT_FIELDS)
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                project_url TEXT NOT NULL,
+                collect_date TEXT NOT NULL,
+                {columns},
+                PRIMARY KEY (project_url, collect_date)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_date ON snapshots (collect_date)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0')")
+        self._conn.commit()
+
+        self._matrix_path = f"{self.path}.npy"
+        self._index_path = f"{self.path}.index.json"
+        self._matrix = None
+        self._index = None
+
+    def high_water_mark(self, project_url: str) -> Optional[str]:
+        """
+        本地已同步的最新 collect_date
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(collect_date) FROM snapshots WHERE project_url = ?", (project_url,)).fetchone()
+        return row[0]
+
+    def upsert(self, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        写入DynamoDB原始记录中的数值字段，其他字段忽略
+
+        Returns:
+            写入的记录数
+        """
+        rows = [
+            (item['project_url'], item['collect_date'], *(_to_number(item.get(field)) for field in SNAPSHOT_FIELDS))
+            for item in items
+        ]
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" for _ in range(len(SNAPSHOT_FIELDS) + 2))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO snapshots (project_url, collect_date, {', '.join(SNAPSHOT_FIELDS)}) VALUES ({placeholders})",
+                rows
+            )
+            self._conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+            self._conn.commit()
+        return len(rows)
+
+    def sync(self, project_urls: List[str], table_name: str = RAW_DATA_TABLE, region: str = 'us-east-1', access: Optional[DynamoDBAccess] = None) -> int:
+        """
+        从DynamoDB增量同步：每个repo只查询 collect_date 大于本地高水位的记录，多个repo并行查询
+
+        Args:
+            project_urls: 需要同步的repo
+            table_name: 原始数据表名
+            region: DynamoDB所在区域
+            access: 数据访问层，默认连接 region 中的DynamoDB
+
+        Returns:
+            新同步的记录数
+        """
+        access = access or DynamoDBAccess(region=region)
+        high_water_marks = {url: self.high_water_mark(url) for url in project_urls}
+        results = access.query_many(
+            table_name,
+            project_urls,
+            sort_after={url: hwm for url, hwm in high_water_marks.items() if hwm is not None},
+            projection=['project_url', 'collect_date', *SNAPSHOT_FIELDS]
+        )
+        total = self.upsert(item for items in results.values() for item in items)
+        logger.info(f"快照同步完成: {len(project_urls)} 个repo, 新增 {total} 条记录")
+        return total
+
+    def load_window(self, end_date: str, days: int = 15, project_urls: Optional[List[str]] = None) -> Tuple[List[str], List[str], Dict[str, np.ndarray]]:
+        """
+        读取截止到 end_date（含）的 days 天的快照，对齐为 repos × days 矩阵
+
+        Args:
+            end_date: 窗口最后一天 (YYYY-MM-DD)
+            days: 窗口天数 (default: 15)
+            project_urls: 需要的repo，默认为窗口内出现过的所有repo
+
+        Returns:
+            (repos, dates, {field: float数组[len(repos), len(dates)]})，缺失的天为NaN
+        """
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+        dates = [(end - timedelta(days=days - 1 - i)).strftime("%Y-%m-%d") for i in range(days)]
+
+        matrix, index = self._load_matrix()
+        repos = list(project_urls) if project_urls is not None else list(index['repos'])
+        values = np.full((len(SNAPSHOT_FIELDS), len(repos), len(dates)), np.nan)
+        if matrix is None:
+            return repos, dates, {field: values[i] for i, field in enumerate(SNAPSHOT_FIELDS)}
+
+        # 窗口与矩阵日期范围的交集
+        first_day = datetime.strptime(index['first_date'], "%Y-%m-%d")
+        offset = (datetime.strptime(dates[0], "%Y-%m-%d") - first_day).days
+        src_start, src_end = max(offset, 0), min(offset + days, matrix.shape[2])
+        if src_start < src_end:
+            dst_start = src_start - offset
+            dst_end = dst_start + (src_end - src_start)
+            if project_urls is None:
+                values[:, :, dst_start:dst_end] = matrix[:, :, src_start:src_end]
+            else:
+                repo_index = {repo: i for i, repo in enumerate(index['repos'])}
+                known = [(dst, repo_index[repo]) for dst, repo in enumerate(repos) if repo in repo_index]
+                if known:
+                    dst_rows, src_rows = zip(*known)
+                    values[:, list(dst_rows), dst_start:dst_end] = matrix[:, list(src_rows), src_start:src_end]
+
+        if project_urls is None:
+            # 只保留窗口内出现过数据的repo
+            present = ~np.all(np.isnan(values), axis=(0, 2))
+            repos = [repo for repo, keep in zip(repos, present) if keep]
+            values = values[:, present, :]
+        return repos, dates, {field: values[i] for i, field in enumerate(SNAPSHOT_FIELDS)}
+
+    def _version(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+
+    def _load_matrix(self) -> Tuple[Optional[np.ndarray], Dict[str, Any]]:
+        version = self._version()
+        if self._index is not None and self._index['version'] == version:
+            return self._matrix, self._index
+
+        if os.path.exists(self._index_path) and os.path.exists(self._matrix_path):
+            with open(self._index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            if index['version'] == version:
+                self._matrix = np.load(self._matrix_path, mmap_mode='r') if index['repos'] else None
+                self._index = index
+                return self._matrix, self._index
+
+        self._rebuild_matrix(version)
+        return self._matrix, self._index
+
+    def _rebuild_matrix(self, version: int):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT project_url, collect_date, {', '.join(SNAPSHOT_FIELDS)} FROM snapshots ORDER BY project_url, collect_date"
+            ).fetchall()
+
+        if not rows:
+            self._matrix, self._index = None, {'version': version, 'repos': [], 'first_date': None}
+            return
+
+        repos = sorted({row[0] for row in rows})
+        repo_index = {repo: i for i, repo in enumerate(repos)}
+        collect_dates = sorted({row[1] for row in rows})
+        first_day = datetime.strptime(collect_dates[0], "%Y-%m-%d")
+        last_day = datetime.strptime(collect_dates[-1], "%Y-%m-%d")
+        date_offset = {date: (datetime.strptime(date, "%Y-%m-%d") - first_day).days for date in collect_dates}
+
+        repo_pos = np.fromiter((repo_index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+        day_pos = np.fromiter((date_offset[row[1]] for row in rows), dtype=np.int64, count=len(rows))
+        data = np.array([row[2:] for row in rows], dtype=float)
+
+        matrix = np.full((len(SNAPSHOT_FIELDS), len(repos), (last_day - first_day).days + 1), np.nan)
+        matrix[:, repo_pos, day_pos] = data.T
+
+        tmp_path = f"{self._matrix_path}.tmp.npy"
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, self._matrix_path)
+        index = {'version': version, 'repos': repos, 'first_date': first_day.strftime("%Y-%m-%d")}
+        with open(self._index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+
+        self._matrix = np.load(self._matrix_path, mmap_mode='r')
+        self._index = index
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def main():
+    import argparse
+    from job_scheduler import load_watchlist
+
+    parser = argparse.ArgumentParser(description='同步github-insight-raw-data的数值快照到本地')
+    parser.add_argument('--path', type=str, default=None, help='本地SQLite文件 (默认: $SNAPSHOT_STORE_PATH 或 snapshots.sqlite3)')
+    parser.add_argument('--region', type=str, default='us-east-1', help='DynamoDB所在区域 (默认: us-east-1)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    repos = [item['project_url'] for item in load_watchlist(region=args.region)]
+    with SnapshotStore(args.path) as store:
+        store.sync(repos, region=args.region)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import json
+import re
+from typing import Dict, Any, AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional
+from json_repair import repair_json
+
+
+class SSEDecoder:
+    """
+    增量解析Dify工作流的SSE流
+
+    每次 feed 一段原始字节，返回其中已经完整的事件；不完整的行保留在缓冲区，
+    因此无论网络分包如何切分（包括多字节UTF-8字符被切开），结果都一致。
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._event_name: Optional[str] = None
+        self._data_lines: List[str] = []
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        """
+        Feed raw bytes from the response body.
+
+        Args:
+            chunk: The next piece of the response body
+
+        Returns:
+            The events completed by this chunk, in stream order
+        """
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        events = []
+        for raw_line in lines:
+            event = self._process_line(raw_line.rstrip(b"\r").decode("utf-8", errors="replace"))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """
+        Flush the trailing line and any pending event at end of stream.
+
+        Returns:
+            The remaining events
+        """
+        events = []
+        if self._buffer:
+            event = self._process_line(self._buffer.rstrip(b"\r").decode("utf-8", errors="replace"))
+            self._buffer = b""
+            if event is not None:
+                events.append(event)
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _process_line(self, line: str) -> Optional[Dict[str, Any]]:
+        # 空行表示一个事件结束
+        if not line:
+            return self._dispatch()
+        if line.startswith(":"):
+            return None
+
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+
+        if field == "data":
+            # Dify每个事件只有一行data，收到即可分发，不必等空行
+            self._data_lines.append(value)
+            return self._dispatch()
+        if field == "event":
+            self._event_name = value
+        return None
+
+    def _dispatch(self) -> Optional[Dict[str, Any]]:
+        event_name, data_lines = self._event_name, self._data_lines
+        self._event_name, self._data_lines = None, []
+
+        if not data_lines:
+            # 例如 "event: ping"，只是保活，不对外暴露
+            return None
+        try:
+            data = json.loads("\n".join(data_lines))
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        if event_name and "event" not in data:
+            data["event"] = event_name
+        return data
+
+
+def iter_sse_events(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """
+    将字节流增量解析为事件（text_chunk / node_started / workflow_finished 等）
+    """
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+async def aiter_sse_events(chunks: AsyncIterable[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    iter_sse_events 的异步版本
+    """
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
+
+
+def text_of(event: Dict[str, Any]) -> Optional[str]:
+    """
+    如果是 text_chunk 事件，返回其文本，否则返回 None
+    """
+    if event.get("event") != "text_chunk":
+        return None
+    return event.get("data", {}).get("text", "")
+
+
+# workflow_finished.data.status / blocking响应 data.status 中表示运行失败的值
+FAILED_STATUSES = ("failed", "stopped")
+
+
+def run_failure(data: Dict[str, Any]) -> Optional[str]:
+    """
+    工作流运行结果（workflow_finished的data，或blocking响应的data）失败时返回错误信息
+    """
+    status = data.get("status")
+    if status in FAILED_STATUSES:
+        return data.get("error") or f"工作流运行状态: {status}"
+    return None
+
+
+def failure_of(event: Dict[str, Any]) -> Optional[str]:
+    """
+    Dify在HTTP 200的流中报告运行失败：error 事件，或 status 为 failed/stopped 的
+    workflow_finished 事件。是这两种情况时返回错误信息，否则返回 None
+    """
+    name = event.get("event")
+    if name == "error":
+        return event.get("message") or event.get("code") or "工作流返回error事件"
+    if name == "workflow_finished":
+        return run_failure(event.get("data") or {})
+    return None
+
+
+def iter_text_chunks(events: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    只保留 text_chunk 事件的文本
+    """
+    for event in events:
+        text = text_of(event)
+        if text is not None:
+            yield text
+
+
+class IncrementalJSONArrayParser:
+    """
+    从逐段到达的文本中增量提取JSON数组的元素
+
+    LLM的输出通常是一个JSON数组（可能被```json包裹），每当一个顶层元素闭合时
+    就立即把它解析出来，已经消费过的文本不会继续保留。单个元素无法被json解析时
+    使用json_repair修复；流在中途结束时，flush 会尝试修复最后一个不完整的元素。
+
+    数组只从行首（或代码块标记之后）的 "[" 开始，说明文字中的 "[见下文]" 之类不会被误认；
+    如果第一个元素无法解析，说明找错了起点，从该 "[" 之后继续寻找下一个起点。
+    到 flush 时仍没有得到任何元素（例如整个数组与说明文字在同一行 "结果: [...]"），
+    则对缓存的原文从第一个 "[" 开始不限行首地重新解析。
+    """
+
+    # 数组起点前允许出现的行内容：空白或 ```json 之类的代码块标记
+    _ANCHOR_PREFIX = re.compile(r"\s*(```[\w-]*)?\s*")
+    _MAX_PREFIX = 32
+
+    def __init__(self, repair: bool = True, anchored: bool = True):
+        """
+        Args:
+            repair: 是否用json_repair修复不合法或被截断的元素
+            anchored: 是否只从行首的 "[" 开始（False 时任何 "[" 都可以是起点，用于 flush 的回退解析）
+        """
+        self.repair = repair
+        self.anchored = anchored
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._element: List[str] = []
+        self._line = ""
+        # 第一个元素成功解析之前，记录起点之后的原文，用于重新寻找起点
+        self._replay: Optional[List[str]] = None
+        self._emitted = 0
+        # 产出第一个元素之前收到的全部原文，供 flush 回退解析
+        self._unparsed: Optional[List[str]] = [] if anchored else None
+
+    def feed(self, text: str) -> List[Any]:
+        """
+        Feed the next piece of text.
+
+        Args:
+            text: A text chunk from the workflow output
+
+        Returns:
+            The array elements completed by this chunk
+        """
+        records = []
+        if self._unparsed is not None:
+            self._unparsed.append(text)
+        self._consume(text, records)
+        if self._emitted:
+            self._unparsed = None
+        return records
+
+    def _consume(self, text: str, records: List[Any]):
+        for ch in text:
+            if self._finished:
+                break
+            if not self._started:
+                # 跳过数组开始前的说明文字或代码块标记
+                if ch == "[" and self._at_anchor():
+                    self._started = True
+                    self._replay = [] if self._emitted == 0 else None
+                elif ch == "\n":
+                    self._line = ""
+                elif len(self._line) <= self._MAX_PREFIX:
+                    self._line += ch
+                continue
+
+            if self._replay is not None:
+                self._replay.append(ch)
+
+            if self._in_string:
+                self._element.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 0 and ch in ",]":
+                if not self._emit(records):
+                    # 起点错误，已从下一个位置重新开始
+                    continue
+                if ch == "]":
+                    self._finished = True
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+            self._element.append(ch)
+
+    def _at_anchor(self) -> bool:
+        if not self.anchored:
+            return True
+        return len(self._line) <= self._MAX_PREFIX and self._ANCHOR_PREFIX.fullmatch(self._line) is not None
+
+    def flush(self) -> List[Any]:
+        """
+        Emit whatever can be salvaged from an unterminated trailing element.
+
+        Returns:
+            A list holding the repaired element, or an empty list
+        """
+        records = []
+        if self.repair and self._started and not self._finished:
+            self._emit(records, restart=False)
+        self._element = []
+
+        unparsed, self._unparsed = self._unparsed, None
+        if not records and not self._emitted and unparsed:
+            text = "".join(unparsed)
+            start = text.find("[")
+            if start >= 0:
+                fallback = IncrementalJSONArrayParser(repair=self.repair, anchored=False)
+                records = fallback.feed(text[start:]) + fallback.flush()
+                self._emitted += len(records)
+        return records
+
+    def _reset_element(self):
+        self._element = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _emit(self, records: List[Any], restart: bool = True) -> bool:
+        """
+        解析当前元素；第一个元素无法解析时重新寻找起点并返回False
+        """
+        fragment = "".join(self._element).strip()
+        self._reset_element()
+        if not fragment:
+            return True
+        try:
+            records.append(json.loads(fragment))
+            self._emitted += 1
+            self._replay = None
+            return True
+        except json.JSONDecodeError:
+            if restart and self._emitted == 0 and self._replay is not None:
+                replay = "".join(self._replay)
+                self._started = False
+                self._replay = None
+                # "[" 之后的内容与它在同一行，不可能再是行首
+                self._line = "["
+                self._consume(replay, records)
+                return False
+            if not self.repair:
+                return True
+        repaired = repair_json(fragment, return_objects=True)
+        if repaired not in ("", None):
+            records.append(repaired)
+            self._emitted += 1
+            self._replay = None
+        return True
+
+
+def iter_json_records(text_chunks: Iterable[str], repair: bool = True) -> Iterator[Any]:
+    """
+    将文本块流转换为JSON数组元素流，每个元素一完整就立即产出
+
+    Args:
+        text_chunks: 文本块，例如 iter_text_chunks 的输出
+        repair: 是否用json_repair修复不合法或被截断的元素 (default: True)
+    """
+    parser = IncrementalJSONArrayParser(repair=repair)
+    for text in text_chunks:
+        yield from parser.feed(text)
+    yield from parser.flush()
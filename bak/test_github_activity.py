@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from fake_github_server import FakeGitHubServer
+from github_activity import ETagStore, GitHubActivityClient
+
+SINCE = '2025-10-01'
+
+
+@pytest.fixture
+def server():
+    with FakeGitHubServer() as server:
+        server.set_repo('org/busy', commit_dates=['2025-10-02T08:00:00Z', '2025-09-20T08:00:00Z'])
+        server.set_repo('org/reviewed', pull_dates=['2025-10-03T08:00:00Z'], merged_dates=['2025-10-03T09:00:00Z'])
+        server.set_repo('org/quiet', commit_dates=['2025-09-01T08:00:00Z'], pull_dates=['2025-09-02T08:00:00Z'])
+        yield server
+
+
+@pytest.fixture
+def client(server, tmp_path):
+    client = GitHubActivityClient(api_base_url=server.url, token='test', etag_store=ETagStore(str(tmp_path / 'etags.sqlite3')))
+    yield client
+    client.close()
+
+
+def test_filter_active_splits_repos_and_keeps_order(server, client):
+    repos = [f'https://github.com/org/{name}' for name in ('quiet', 'busy', 'missing', 'reviewed')]
+
+    active, quiet = client.filter_active(repos, SINCE)
+
+    # 查询失败（404）的repo按有活动处理
+    assert active == ['https://github.com/org/busy', 'https://github.com/org/missing', 'https://github.com/org/reviewed']
+    assert quiet == ['https://github.com/org/quiet']
+
+
+def test_filter_active_revalidates_with_etags(server, client):
+    repos = [f'https://github.com/org/{name}' for name in ('busy', 'reviewed', 'quiet')]
+    first = client.filter_active(repos, SINCE)
+    assert server.stats['ok'] == 6 and server.stats['not_modified'] == 0
+
+    second = client.filter_active(repos, SINCE)
+    assert second == first
+    assert server.stats['ok'] == 6 and server.stats['not_modified'] == 6
+
+    # 数据变化后ETag随之变化，只有该repo的接口重新返回200
+    server.set_repo('org/quiet', commit_dates=['2025-10-05T08:00:00Z'])
+    active, quiet = client.filter_active(repos, SINCE)
+    assert active == repos and quiet == []
+    assert server.stats['ok'] == 8 and server.stats['not_modified'] == 10
+
+
+def test_filter_active_uses_one_session_per_thread(server, client):
+    repos = [f'https://github.com/org/busy-{i}' for i in range(16)]
+    for repo in repos:
+        server.set_repo(repo.split('github.com/')[1], commit_dates=['2025-10-02T08:00:00Z'])
+
+    used = {}
+    lock = threading.Lock()
+    original = client._session
+
+    def record_session():
+        session = original()
+        with lock:
+            used.setdefault(id(session), set()).add(threading.get_ident())
+        return session
+
+    client._session = record_session
+    active, _ = client.filter_active(repos, SINCE, max_workers=4)
+
+    assert active == repos
+    assert all(len(threads) == 1 for threads in used.values())
+    assert len(client._sessions) == len(used)
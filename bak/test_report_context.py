@@ -0,0 +1,34 @@
+import pytest
+
+from report_context import CLOUD_PATTERNS
+
+
+def providers(text):
+    return [provider for provider, pattern in CLOUD_PATTERNS.items() if pattern.search(text)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Add Bedrock Converse API support", ['AWS']),
+    ("Deploy to SageMaker endpoints", ['AWS']),
+    ("Support Azure OpenAI deployments", ['Azure']),
+    ("Add AzureOpenAI client", ['Azure']),
+    ("Add Azure AI Inference provider", ['Azure']),
+    ("Support Azure AI Studio deployments", ['Azure']),
+    ("Azure ML endpoints", ['Azure']),
+    ("Models from AI Foundry", ['Azure']),
+    ("Add Gemini via Vertex", ['Google Cloud']),
+    ("Vertex AI embeddings", ['Google Cloud']),
+    ("use the vertexai SDK", ['Google Cloud']),
+    ("DashScope qwen models", ['Ali Cloud']),
+    ("Bailian app integration", ['Ali Cloud']),
+    ("Deploy on PAI-EAS", ['Ali Cloud']),
+    ("Alibaba Cloud PAI support", ['Ali Cloud']),
+    # 只有厂商名、没有GenAI服务名的不算
+    ("Use AWS S3 for storage", []),
+    ("Upload artifacts to Google Cloud Storage", []),
+    ("Store logs in Azure Blob", []),
+    ("Mirror wheels on aliyun oss", []),
+    ("Add GCP credentials helper", []),
+])
+def test_cloud_patterns(text, expected):
+    assert providers(text) == expected
@@ -0,0 +1,56 @@
+import pytest
+
+from result_cache import SQL_BATCH_SIZE, WorkflowResultCache
+
+WORKFLOW = 'github_repo_analyze'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with WorkflowResultCache(str(tmp_path / 'cache.sqlite3')) as cache:
+        yield cache
+
+
+def _statements(cache):
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    return statements
+
+
+def _accessed_at(cache):
+    return dict(cache._conn.execute("SELECT inputs, accessed_at FROM workflow_results").fetchall())
+
+
+def test_pending_skips_successes_only(cache):
+    records = [{"repo": f"org/repo-{i}", "start_date": "2025-10-01"} for i in range(4)]
+    cache.put_success(WORKFLOW, records[0], {"summary": "ok"})
+    cache.put_failure(WORKFLOW, records[1], "504")
+    cache.put_success('other_workflow', records[2], {"summary": "ok"})
+
+    assert cache.pending(WORKFLOW, records) == records[1:]
+    assert cache.is_completed(WORKFLOW, records[0])
+    assert not cache.is_completed(WORKFLOW, records[1])
+
+
+def test_pending_touches_completed_entries_in_one_commit(cache):
+    records = [{"repo": f"org/repo-{i}", "start_date": "2025-10-01"} for i in range(SQL_BATCH_SIZE * 2 + 10)]
+    for record in records[:-10]:
+        cache.put_success(WORKFLOW, record, {"summary": "ok"})
+    before = _accessed_at(cache)
+
+    statements = _statements(cache)
+    assert cache.pending(WORKFLOW, records) == records[-10:]
+
+    assert sum(statement.startswith('UPDATE') for statement in statements) == 2
+    assert statements.count('COMMIT') == 1
+    after = _accessed_at(cache)
+    assert all(after[inputs] > before[inputs] for inputs in before)
+
+
+def test_is_completed_does_not_write(cache):
+    record = {"repo": "org/repo", "start_date": "2025-10-01"}
+    cache.put_success(WORKFLOW, record, {"summary": "ok"})
+
+    statements = _statements(cache)
+    assert cache.is_completed(WORKFLOW, record)
+    assert not any(statement.startswith(('UPDATE', 'COMMIT')) for statement in statements)
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from sse_parser import IncrementalJSONArrayParser, iter_json_records, iter_sse_events, iter_text_chunks
+
+RECORDS = [{"name": "vllm", "stars": 1200}, {"name": "sglang", "note": "支持 [beta] 功能"}]
+
+
+def parse(text, chunk_size=None):
+    if chunk_size is None:
+        return list(iter_json_records([text]))
+    return list(iter_json_records(text[i:i + chunk_size] for i in range(0, len(text), chunk_size)))
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7])
+@pytest.mark.parametrize("text", [
+    json.dumps(RECORDS),
+    "```json\n" + json.dumps(RECORDS, indent=2, ensure_ascii=False) + "\n```",
+    "Here is the list [see below]:\n```json\n" + json.dumps(RECORDS) + "\n```\nDone [1].",
+    "[Note] 以下为结果\n" + json.dumps(RECORDS, ensure_ascii=False),
+    "Trending repos: " + json.dumps(RECORDS, ensure_ascii=False) + " (共2个)",
+    'Result [draft]: ' + json.dumps(RECORDS),
+], ids=["bare", "fenced", "preamble", "bracket-line", "inline", "inline-after-bracket"])
+def test_extracts_array(text, chunk_size):
+    assert parse(text, chunk_size) == RECORDS
+
+
+def test_truncated_element_is_repaired():
+    text = '```json\n[{"name": "vllm", "stars": 1200}, {"name": "sglang", "stars": 3'
+    assert parse(text, 5) == [{"name": "vllm", "stars": 1200}, {"name": "sglang", "stars": 3}]
+
+
+def test_elements_are_emitted_as_soon_as_they_close():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(': 2}]') == [{"b": 2}]
+    assert parser.flush() == []
+
+
+def test_no_array_yields_nothing():
+    assert parse("没有找到符合条件的repo。") == []
+
+
+def test_multibyte_utf8_split_across_chunks():
+    text = json.dumps(RECORDS, ensure_ascii=False)
+    body = "".join(
+        f"data: {json.dumps({'event': 'text_chunk', 'data': {'text': text[i:i + 4]}}, ensure_ascii=False)}\n\n"
+        for i in range(0, len(text), 4)
+    ).encode("utf-8")
+    # 每个字节单独到达，中文字符的多个字节被切开
+    chunks = [body[i:i + 1] for i in range(len(body))]
+
+    assert "".join(iter_text_chunks(iter_sse_events(chunks))) == text
+    assert list(iter_json_records(iter_text_chunks(iter_sse_events(chunks)))) == RECORDS
@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from trend_index import extract_candidates
+
+RECORDS = [{"url": "https://github.com/Foo/Bar", "stars": "1,200", "tags": ["llm"]}, {"project_url": "github.com/x/y", "stars": "12.5k"}]
+EXPECTED = [{"project_url": "https://github.com/Foo/Bar", "stars": 1200}, {"project_url": "github.com/x/y", "stars": 12500}]
+
+
+@pytest.mark.parametrize("output", [
+    "```json\n" + json.dumps(RECORDS, indent=2) + "\n```",
+    "Trending repos: " + json.dumps(RECORDS),
+    json.dumps({"repos": RECORDS}),
+    json.dumps({"repos": RECORDS}, indent=2),
+    {"text": json.dumps(RECORDS)},
+    {"result": RECORDS},
+    {"result": {"repos": RECORDS, "count": 2}},
+], ids=["fenced", "inline", "object", "object-indented", "blocking-text", "blocking-list", "blocking-nested"])
+def test_extract_candidates(output):
+    assert extract_candidates(output) == EXPECTED
+
+
+def test_extract_candidates_without_records():
+    assert extract_candidates("今天没有新的trending repo。") == []
+    assert extract_candidates({"text": ""}) == []
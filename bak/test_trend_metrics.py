@@ -0,0 +1,54 @@
+import numpy as np
+
+from trend_metrics import daily_deltas, filter_outliers
+
+
+def _whole_window(deltas: np.ndarray, outlier_factor: float = 3.0) -> np.ndarray:
+    filtered = np.where(deltas > 0, deltas, np.nan)
+    mean = np.nanmean(filtered, axis=-1, keepdims=True)
+    return np.where(filtered > outlier_factor * mean, np.nan, filtered)
+
+
+def test_spikes_at_start_of_report_window_are_dropped():
+    first = np.array([[100.0] + [5.0] * 14])
+    third = np.array([[5.0, 5.0, 500.0] + [5.0] * 12])
+
+    assert np.isnan(filter_outliers(first)[0, 0])
+    assert np.isnan(filter_outliers(third)[0, 2])
+    assert not np.isnan(filter_outliers(first)[0, 1:]).any()
+
+
+def test_report_window_uses_whole_series_mean():
+    rng = np.random.default_rng(0)
+    deltas = rng.integers(-2, 20, size=(3, 4, 15)).astype(float)
+    deltas[0, 0, 7] = 400
+    deltas[1, 2, 3] = np.nan
+
+    np.testing.assert_array_equal(filter_outliers(deltas), _whole_window(deltas))
+
+
+def test_long_series_uses_window_around_each_point():
+    # 前半段量级为100，后半段为5；整体均值会把后半段的尖峰掩盖，局部窗口不会
+    deltas = np.array([[100.0] * 30 + [5.0] * 30])
+    deltas[0, 50] = 60
+
+    filtered = filter_outliers(deltas)
+    assert np.isnan(filtered[0, 50])
+    assert not np.isnan(filtered[0, :30]).any()
+    assert not np.isnan(_whole_window(deltas)[0, 50])
+
+
+def test_non_positive_deltas_are_missing():
+    filtered = filter_outliers(np.array([[0.0, -3.0, 4.0, np.nan, 4.0]]))
+    np.testing.assert_array_equal(np.isnan(filtered), [[True, True, False, True, False]])
+
+
+def test_daily_deltas_span_missing_snapshots():
+    zeros = np.zeros((1, 6))
+    snapshots = {'open_pr': zeros, 'merged_pr': zeros, 'open_issue': zeros, 'closed_issue': zeros,
+                 'star': np.array([[0.0, 10.0, 20.0, np.nan, 40.0, 50.0]])}
+
+    new_star = daily_deltas(snapshots)[3, 0]
+
+    np.testing.assert_array_equal(new_star, [10.0, 10.0, np.nan, 20.0, 10.0])
+    assert np.nansum(new_star) == 50
@@ -0,0 +1,379 @@
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+
+import requests
+from json_repair import repair_json
+
+from dify_helper import client_registry
+from dynamodb_access import DynamoDBAccess, TREND_CANDIDATES_TABLE
+from github_activity import GitHubActivityClient, parse_repo
+from instrumentation import Instrumentation
+from result_cache import normalize_inputs
+from sse_parser import iter_json_records
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TREND_INDEX_PATH = 'trend_candidates.sqlite3'
+
+# 工作流输出中可能表示repo地址 / star数的字段
+URL_FIELDS = ('project_url', 'url', 'repo', 'html_url', 'link')
+STAR_FIELDS = ('stars', 'star', 'stargazers_count', 'total_stars')
+
+
+def normalize_project_url(url: str) -> str:
+    """
+    github.com/Owner/Repo(.git)(/) -> https://github.com/owner/repo
+    """
+    url = url.strip()
+    if '://' not in url and url.lower().startswith(('github.com/', 'www.github.com/')):
+        url = f"https://{url}"
+    try:
+        owner, name = parse_repo(url)
+    except ValueError:
+        return normalize_inputs({'project_url': url})['project_url']
+    return f"https://github.com/{owner}/{name}".lower()
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return int(value)
+    text = str(value).replace(',', '').strip().lower()
+    try:
+        # 例如 "12.3k"
+        if text.endswith('k'):
+            return int(float(text[:-1]) * 1000)
+        return int(float(text))
+    except ValueError:
+        return None
+
+
+class BloomFilter:
+    """
+    判断 project_url 是否“一定没见过”的内存过滤器，没见过的候选不必查询SQLite
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+@dataclass
+class CandidateEntry:
+    project_url: str
+    first_seen: str
+    last_seen: str
+    last_analyzed: Optional[str]
+    stars: Optional[int]
+    analyzed_stars: Optional[int]
+    seen_days: int
+
+
+class TrendCandidateIndex:
+    """
+    github-trend-repo-candidates 的本地去重索引（SQLite，可选Bloom过滤器）
+
+    以规范化的 project_url 为键，记录首次出现日期、最近一次出现/分析的日期和star数。
+    连续多天出现在trending中、且star没有明显变化的repo会作为 exclude_repos 传给
+    github_trend_analyze 工作流，不再重复分析和写入。
+    """
+
+    def __init__(self, path: Optional[str] = None, use_bloom: bool = True, bloom_capacity: int = 100000):
+        """
+        Args:
+            path: SQLite文件路径，默认取环境变量 TREND_INDEX_PATH，未设置时为 trend_candidates.sqlite3
+            use_bloom: 是否使用Bloom过滤器加速“新候选”的判断（record()中跳过新候选的查询）
+            bloom_capacity: Bloom过滤器的预期容量
+        """
+        self.path = path or os.getenv('TREND_INDEX_PATH', DEFAULT_TREND_INDEX_PATH)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS candidates (
+                project_url TEXT PRIMARY KEY,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                last_analyzed TEXT,
+                stars INTEGER,
+                analyzed_stars INTEGER,
+                seen_days INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_candidates_analyzed ON candidates (last_analyzed)")
+        self._conn.commit()
+
+        self._bloom = None
+        if use_bloom:
+            count = self._conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+            self._bloom = BloomFilter(max(bloom_capacity, count * 2))
+            for (url,) in self._conn.execute("SELECT project_url FROM candidates"):
+                self._bloom.add(url)
+
+    def get(self, project_url: str) -> Optional[CandidateEntry]:
+        url = normalize_project_url(project_url)
+        if self._bloom is not None and url not in self._bloom:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT project_url, first_seen, last_seen, last_analyzed, stars, analyzed_stars, seen_days FROM candidates WHERE project_url = ?",
+                (url,)
+            ).fetchone()
+        return CandidateEntry(*row) if row else None
+
+    def __contains__(self, project_url: str) -> bool:
+        return self.get(project_url) is not None
+
+    def record(self, candidates: Iterable[Dict[str, Any]], collect_date: str, analyzed: bool = True) -> Tuple[int, int]:
+        """
+        记录当天出现的候选
+
+        Args:
+            candidates: 至少包含 project_url 的dict，stars 可选
+            collect_date: 日期 (YYYY-MM-DD)
+            analyzed: 这些候选是否已经过LLM分析（写入了 github-trend-repo-candidates）
+
+        Returns:
+            (新候选数, 已存在的候选数)
+        """
+        new, existing = 0, 0
+        with self._lock:
+            for candidate in candidates:
+                url = normalize_project_url(candidate['project_url'])
+                stars = _to_int(candidate.get('stars'))
+                inserted = False
+                # Bloom过滤器判定一定没见过的候选直接插入，省去逐条SELECT；其他进程可能已写入，冲突时按已存在处理
+                if self._bloom is not None and url not in self._bloom:
+                    inserted = self._insert(url, collect_date, stars, analyzed)
+                elif self._conn.execute("SELECT 1 FROM candidates WHERE project_url = ?", (url,)).fetchone() is None:
+                    inserted = self._insert(url, collect_date, stars, analyzed)
+                if inserted:
+                    new += 1
+                else:
+                    existing += 1
+                    self._conn.execute("""
+                        UPDATE candidates SET
+                            first_seen = MIN(first_seen, :date),
+                            last_seen = MAX(last_seen, :date),
+                            seen_days = seen_days + (CASE WHEN last_seen < :date THEN 1 ELSE 0 END),
+                            stars = CASE WHEN last_seen <= :date THEN COALESCE(:stars, stars) ELSE stars END,
+                            last_analyzed = CASE WHEN :analyzed AND (last_analyzed IS NULL OR last_analyzed <= :date) THEN :date ELSE last_analyzed END,
+                            analyzed_stars = CASE WHEN :analyzed AND (last_analyzed IS NULL OR last_analyzed <= :date) THEN COALESCE(:stars, analyzed_stars) ELSE analyzed_stars END
+                        WHERE project_url = :url
+                    """, {"date": collect_date, "stars": stars, "analyzed": int(analyzed), "url": url})
+                if self._bloom is not None:
+                    self._bloom.add(url)
+            self._conn.commit()
+        return new, existing
+
+    def _insert(self, url: str, collect_date: str, stars: Optional[int], analyzed: bool) -> bool:
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO candidates (project_url, first_seen, last_seen, last_analyzed, stars, analyzed_stars, seen_days) VALUES (?, ?, ?, ?, ?, ?, 1)",
+            (url, collect_date, collect_date, collect_date if analyzed else None, stars, stars if analyzed else None)
+        )
+        return cursor.rowcount == 1
+
+    def recently_analyzed(self, collect_date: str, days: int = 7) -> List[CandidateEntry]:
+        """
+        在 collect_date 之前 days 天内（不含当天）分析过的候选
+        """
+        since = (datetime.strptime(collect_date, "%Y-%m-%d") - timedelta(days=days)).strftime("%Y-%m-%d")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT project_url, first_seen, last_seen, last_analyzed, stars, analyzed_stars, seen_days FROM candidates "
+                "WHERE last_analyzed >= ? AND last_analyzed < ? ORDER BY project_url",
+                (since, collect_date)
+            ).fetchall()
+        return [CandidateEntry(*row) for row in rows]
+
+    def exclusions(self, collect_date: str, current_stars: Optional[Dict[str, int]] = None, reanalyze_days: int = 7, min_star_growth: float = 0.2, min_new_stars: int = 1000) -> List[str]:
+        """
+        本次无需重新分析的候选：最近 reanalyze_days 天内分析过，且star没有明显增长
+
+        Args:
+            collect_date: 日期 (YYYY-MM-DD)
+            current_stars: 已知的当前star数（规范化URL -> star），未知的候选按没有变化处理
+            reanalyze_days: 分析结果的有效天数，超过后即使没有变化也重新分析 (default: 7)
+            min_star_growth: star相对上次分析时增长超过该比例视为明显变化 (default: 0.2)
+            min_new_stars: star绝对增长超过该值视为明显变化 (default: 1000)
+        """
+        current_stars = current_stars or {}
+        excluded = []
+        for entry in self.recently_analyzed(collect_date, reanalyze_days):
+            stars = current_stars.get(entry.project_url)
+            if stars is not None and entry.analyzed_stars is not None:
+                growth = stars - entry.analyzed_stars
+                if growth >= min_new_stars or (entry.analyzed_stars > 0 and growth / entry.analyzed_stars >= min_star_growth):
+                    logger.info(f"{entry.project_url} star明显增长 ({entry.analyzed_stars} -> {stars})，重新分析")
+                    continue
+            excluded.append(entry.project_url)
+        return excluded
+
+    def sync(self, table_name: str = TREND_CANDIDATES_TABLE, region: str = 'us-east-1', access: Optional[DynamoDBAccess] = None) -> int:
+        """
+        从 github-trend-repo-candidates 导入历史候选（首次使用或本地文件丢失时）
+
+        Returns:
+            导入的记录数
+        """
+        access = access or DynamoDBAccess(region=region)
+        by_date: Dict[str, List[Dict[str, Any]]] = {}
+        for item in access.iter_scan(table_name):
+            stars = next((item[name] for name in STAR_FIELDS if item.get(name) is not None), None)
+            by_date.setdefault(item['collect_date'], []).append({"project_url": item['project_url'], "stars": stars})
+
+        total = 0
+        for collect_date in sorted(by_date):
+            self.record(by_date[collect_date], collect_date)
+            total += len(by_date[collect_date])
+        logger.info(f"从 {table_name} 导入 {total} 条候选记录")
+        return total
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _record_list(value: Any) -> Optional[List[Any]]:
+    """
+    JSON数组本身，或dict中（可嵌套）第一个由dict组成的列表，例如 {"repos": [...]}
+    """
+    if isinstance(value, list):
+        if any(isinstance(item, dict) for item in value):
+            return value
+        for item in value:
+            found = _record_list(item) if isinstance(item, (list, dict)) else None
+            if found is not None:
+                return found
+        return None
+    if isinstance(value, dict):
+        for item in value.values():
+            found = _record_list(item) if isinstance(item, (list, dict)) else None
+            if found is not None:
+                return found
+    return None
+
+
+def extract_candidates(output: Union[Dict, str]) -> List[Dict[str, Any]]:
+    """
+    从 github_trend_analyze 的输出中解析候选 (project_url, stars)
+
+    支持 blocking 模式的输出变量（列表、{"repos": [...]} 之类的dict或JSON文本）和流式输出的文本；
+    增量解析没有得到任何元素时，用json_repair整体解析一次。
+    """
+    records = _record_list(output) if isinstance(output, (dict, list)) else None
+    if records is None:
+        if isinstance(output, dict):
+            # blocking模式: 输出变量中的JSON文本
+            output = next((value for value in output.values() if isinstance(value, str)), "")
+        text = output if isinstance(output, str) else ""
+        records = list(iter_json_records([text]))
+        if not any(isinstance(record, dict) for record in records) and text.strip():
+            records = _record_list(repair_json(text, return_objects=True)) or []
+
+    candidates = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        url = next((record[name] for name in URL_FIELDS if isinstance(record.get(name), str) and 'github.com' in record[name]), None)
+        if url is None:
+            continue
+        stars = next((record[name] for name in STAR_FIELDS if record.get(name) is not None), None)
+        candidates.append({"project_url": url, "stars": _to_int(stars)})
+    return candidates
+
+
+def run_trend_candidates(workflow_api_key: str, collect_date: str, index: TrendCandidateIndex, activity_client: Optional[GitHubActivityClient] = None, reanalyze_days: int = 7, min_star_growth: float = 0.2, instrumentation: Optional[Instrumentation] = None) -> Union[Dict, str]:
+    """
+    运行 github_trend_analyze 工作流，跳过最近已分析且没有明显变化的候选
+
+    Args:
+        workflow_api_key: github_trend_analyze 工作流的API密钥
+        collect_date: 日期 (YYYY-MM-DD)
+        index: 候选去重索引
+        activity_client: 若提供，查询最近分析过的候选的当前star数，star明显增长的不排除
+        reanalyze_days: 分析结果的有效天数 (default: 7)
+        min_star_growth: 视为明显变化的star增长比例 (default: 0.2)
+        instrumentation: 指标采集（可选）
+
+    Returns:
+        工作流输出
+    """
+    current_stars = {}
+    if activity_client is not None:
+        recent = [entry.project_url for entry in index.recently_analyzed(collect_date, reanalyze_days)]
+
+        def lookup(url: str) -> Optional[int]:
+            try:
+                return activity_client.stargazers_count(url)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"获取star数失败，按没有变化处理: {url}, 错误: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            current_stars = {url: stars for url, stars in zip(recent, executor.map(lookup, recent)) if stars is not None}
+
+    excluded = index.exclusions(collect_date, current_stars, reanalyze_days, min_star_growth)
+    logger.info(f"排除 {len(excluded)} 个最近已分析的trend候选")
+
+    # 工作流需要定义 exclude_repos 输入（每行一个repo地址），并跳过其中的repo
+    output, error = client_registry.invoke_result({"exclude_repos": "\n".join(excluded)}, workflow_api_key, instrumentation=instrumentation)
+    if error is not None:
+        logger.error(f"github_trend_analyze 工作流失败: {error}")
+        return output
+
+    excluded = set(excluded)
+    candidates = extract_candidates(output)
+    if not candidates:
+        # 工作流成功但解析不出候选时，索引不会更新，之后的运行也就无法去重
+        logger.warning(f"github_trend_analyze 输出中没有解析到候选，去重索引未更新: {str(output)[:200]}")
+    candidates = [candidate for candidate in candidates if normalize_project_url(candidate['project_url']) not in excluded]
+    new, existing = index.record(candidates, collect_date)
+    logger.info(f"trend候选: 新增 {new} 个, 再次出现 {existing} 个")
+    return output
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='从github-trend-repo-candidates导入历史候选到本地去重索引')
+    parser.add_argument('--path', type=str, default=None, help='本地SQLite文件 (默认: $TREND_INDEX_PATH 或 trend_candidates.sqlite3)')
+    parser.add_argument('--region', type=str, default='us-east-1', help='DynamoDB所在区域 (默认: us-east-1)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with TrendCandidateIndex(args.path) as index:
+        index.sync(region=args.region)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# README §2.1 中的四个统计指标
+METRICS = ('new_pr', 'new_merged_pr', 'new_issue', 'new_star')
+
+# README §2.1: 异常值按15天均值判断
+MEAN_WINDOW = 15
+
+METRIC_LABELS = {
+    'new_pr': '新增PR',
+    'new_merged_pr': '新增Merged PR',
+    'new_issue': '新增Issue',
+    'new_star': '新增Star',
+}
+
+
+@dataclass
+class TrendMetrics:
+    """
+    趋势统计结果
+
+    daily 中每个数组的形状为 [len(repos), len(dates)]，被过滤或缺失的数据点为NaN；
+    dates 是日增量对应的日期（即快照窗口去掉第一天）。
+    """
+    repos: List[str]
+    dates: List[str]
+    daily: Dict[str, np.ndarray]
+    totals: Dict[str, np.ndarray]
+    # 项目维护水平 = Merged PRs / New PRs
+    merge_ratio: np.ndarray
+    # 社区参与度 = Issues / PRs
+    issue_pr_ratio: np.ndarray
+    domains: List[str] = field(default_factory=list)
+    domain_daily: Dict[str, np.ndarray] = field(default_factory=dict)
+    domain_totals: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def repo_summary(self) -> List[Dict[str, Optional[float]]]:
+        """
+        每个repo一行的汇总，便于写入报告或JSON
+        """
+        summary = []
+        for i, repo in enumerate(self.repos):
+            row = {"repo": repo}
+            for name in METRICS:
+                row[name] = _as_float(self.totals[name][i])
+            row["merge_ratio"] = _as_float(self.merge_ratio[i])
+            row["issue_pr_ratio"] = _as_float(self.issue_pr_ratio[i])
+            summary.append(row)
+        return summary
+
+
+def _as_float(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def daily_deltas(snapshots: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    由累计值快照计算四个指标的日增量
+
+    Args:
+        snapshots: {open_pr, merged_pr, open_issue, closed_issue, star} -> [repos, days] 数组，缺失为NaN
+
+    Returns:
+        [len(METRICS), repos, days - 1] 数组；当天快照缺失的增量为NaN，缺失日之后的第一天
+        与最近一个有效快照相减（例如活跃度预过滤跳过的repo），区间内的增量不会丢失
+    """
+    cumulative = np.stack([
+        snapshots['open_pr'] + snapshots['merged_pr'],
+        snapshots['merged_pr'],
+        snapshots['open_issue'] + snapshots['closed_issue'],
+        snapshots['star'],
+    ]).astype(float, copy=False)
+    # 向前填充：每一天取截至当天最近一个有效快照，开头缺失的部分仍为NaN
+    positions = np.where(~np.isnan(cumulative), np.arange(cumulative.shape[-1]), 0)
+    np.maximum.accumulate(positions, axis=-1, out=positions)
+    last_valid = np.take_along_axis(cumulative, positions, axis=-1)
+    return cumulative[..., 1:] - last_valid[..., :-1]
+
+
+def filter_outliers(deltas: np.ndarray, outlier_factor: float = 3.0, mean_window: int = MEAN_WINDOW) -> np.ndarray:
+    """
+    README §2.1 的异常值处理：日增量 ≤ 0 视为缺失；大于15天均值 outlier_factor 倍的点丢弃
+
+    均值按每个repo每个指标、在去掉 ≤ 0 的点之后计算。不超过 mean_window 天时使用整个序列的均值
+    （报告窗口即为这种情况）；更长的序列中每个点使用以它为中心、在数组两端截齐的 mean_window 天窗口，
+    因此窗口开头的点与其他点一样有完整的参照，不会因为只有前几天的数据而无法被丢弃。
+
+    Args:
+        deltas: [..., days] 数组，NaN表示缺失
+        outlier_factor: 异常值阈值倍数 (default: 3.0)
+        mean_window: 计算均值的天数 (default: 15)
+
+    Returns:
+        过滤后的新数组
+    """
+    filtered = np.where(deltas > 0, deltas, np.nan)
+    valid = ~np.isnan(filtered)
+    days = filtered.shape[-1]
+    window = min(max(mean_window, 1), days)
+    # 第t天的窗口为 [lower, lower + window)，前缀和前补0后窗口和 = prefix[lower + window] - prefix[lower]
+    pad = [(0, 0)] * (filtered.ndim - 1) + [(1, 0)]
+    total_prefix = np.pad(np.cumsum(np.where(valid, filtered, 0.0), axis=-1), pad)
+    count_prefix = np.pad(np.cumsum(valid, axis=-1), pad)
+    lower = np.clip(np.arange(days) - window // 2, 0, days - window)
+    total = total_prefix[..., lower + window] - total_prefix[..., lower]
+    count = count_prefix[..., lower + window] - count_prefix[..., lower]
+    mean = np.divide(total, count, out=np.full(total.shape, np.nan), where=count > 0)
+    return np.where(filtered > outlier_factor * mean, np.nan, filtered)
+
+
+def _nansum(values: np.ndarray, axis: int) -> np.ndarray:
+    # 全部缺失时返回NaN，而不是np.nansum的0
+    valid = ~np.isnan(values)
+    total = np.where(valid, values, 0.0).sum(axis=axis)
+    return np.where(valid.any(axis=axis), total, np.nan)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan), where=denominator > 0)
+
+
+def compute_trend_metrics(repos: List[str], dates: List[str], snapshots: Dict[str, np.ndarray], domains: Optional[Dict[str, str]] = None, outlier_factor: float = 3.0) -> TrendMetrics:
+    """
+    一次向量化计算所有repo的日增量、异常值过滤、比值和领域聚合
+
+    Args:
+        repos: repo列表，与数组第0维对应
+        dates: 快照日期，与数组第1维对应
+        snapshots: SnapshotStore.load_window 返回的字段数组
+        domains: repo -> 领域（LLM推理引擎、LLM开发平台等），用于跨项目横向对比
+        outlier_factor: 异常值阈值倍数 (default: 3.0)
+
+    Returns:
+        TrendMetrics
+    """
+    filtered = filter_outliers(daily_deltas(snapshots), outlier_factor)
+    totals = _nansum(filtered, axis=2)
+
+    new_pr, new_merged, new_issue = totals[0], totals[1], totals[2]
+    result = TrendMetrics(
+        repos=list(repos),
+        dates=list(dates[1:]),
+        daily={name: filtered[i] for i, name in enumerate(METRICS)},
+        totals={name: totals[i] for i, name in enumerate(METRICS)},
+        merge_ratio=_ratio(new_merged, new_pr),
+        issue_pr_ratio=_ratio(new_issue, new_pr),
+    )
+
+    if domains:
+        domain_names = sorted({domains[repo] for repo in repos if repo in domains})
+        domain_index = {name: i for i, name in enumerate(domain_names)}
+        # [domains, repos] 的0/1矩阵，通过矩阵乘法一次完成按领域求和
+        membership = np.zeros((len(domain_names), len(repos)))
+        for j, repo in enumerate(repos):
+            if repo in domains:
+                membership[domain_index[domains[repo]], j] = 1.0
+
+        domain_daily = np.einsum('dr,mrt->mdt', membership, np.nan_to_num(filtered, nan=0.0))
+        domain_totals = domain_daily.sum(axis=2)
+        result.domains = domain_names
+        result.domain_daily = {name: domain_daily[i] for i, name in enumerate(METRICS)}
+        result.domain_totals = {name: domain_totals[i] for i, name in enumerate(METRICS)}
+
+    return result
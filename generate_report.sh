@@ -16,8 +16,15 @@ cd -- "$(dirname -- "$0")"
 # 生成报告日期
 report_date=$(date -d "1 day ago" +%Y-%m-%d)
 
+# 预先计算报告上下文（候选Feature、云厂商集成、趋势统计、图表路径），LLM只需要撰写文字
+if context_file=$(python3 bak/report_context.py --date ${report_date} 2>> /tmp/report-${report_date}.log); then
+    prompt="生成${report_date}日的genai insight report, 使用预计算的上下文 ${context_file} 中的数据, 并发送email"
+else
+    prompt="生成${report_date}日的genai insight report, 并发送email"
+fi
+
 # 执行命令，记录日志
-claude -p "生成${report_date}日的genai insight report, 并发送email" --dangerously-skip-permissions > /tmp/report-${report_date}.log
+claude -p "${prompt}" --dangerously-skip-permissions >> /tmp/report-${report_date}.log
 
 # 可选：记录执行时间
 echo "Report generated at $(date)" >> /tmp/report-${report_date}.log
\ No newline at end of file